@@ -0,0 +1,166 @@
+"""Maintenance commands for the neTst backend.
+
+Run from the backend directory so ``.env`` is picked up:
+
+    python manage.py backfill-progress
+    python manage.py check-indexes
+    python manage.py import-questions bank.ndjson
+    python manage.py backfill-question-hashes
+    python manage.py compact-attempts --older-than-days 90
+    python manage.py regrade-attempts QUESTION_ID [QUESTION_ID ...]
+    python manage.py export-attempts attempts.parquet --start 2024-01-01
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+import server
+
+cli = typer.Typer(no_args_is_help=True)
+
+
+@cli.callback()
+def main():
+    """neTst backend maintenance commands"""
+
+
+def require_shared_versions(offline: bool):
+    """Refuse a write a running server could not see.
+
+    With CACHE_SYNC_MODE=off the version counters live in each server process,
+    so a bump made here never reaches them and they keep serving the old bank
+    and answering 304 for the old ETags until restarted.
+    """
+    if server.versions.mode == "off" and not offline:
+        typer.echo("CACHE_SYNC_MODE is off, so a running server would not notice this write. Set "
+                   "CACHE_SYNC_MODE=poll or changestream here and on the server, or pass --offline "
+                   "if no server is running.", err=True)
+        raise typer.Exit(code=2)
+
+
+@cli.command("backfill-progress")
+def backfill_progress(batch_size: int = typer.Option(500, help="Attempts per cursor batch and sessions per bulk write")):
+    """Rebuild the materialized user_progress documents from quiz_attempts"""
+    sessions = asyncio.run(server.rebuild_user_progress(batch_size=batch_size))
+    typer.echo(f"Rebuilt progress for {sessions} sessions")
+
+
+@cli.command("check-indexes")
+def check_indexes():
+    """Apply the index registry and fail if any hot-path query plan is a COLLSCAN"""
+    async def run():
+        await server.ensure_indexes()
+        return await server.find_collscans()
+
+    failures = asyncio.run(run())
+    for name in failures:
+        typer.echo(f"COLLSCAN: {name}", err=True)
+    if failures:
+        raise typer.Exit(code=1)
+    typer.echo(f"All {len(server.HOT_QUERIES)} hot-path queries use an index")
+
+
+@cli.command("import-questions")
+def import_questions(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="NDJSON or CSV file of questions"),
+    format: Optional[str] = typer.Option(None, help="ndjson or csv; guessed from the file extension by default"),
+    chunk_size: int = typer.Option(server.IMPORT_CHUNK_SIZE, help="Questions per bulk write"),
+    offline: bool = typer.Option(False, "--offline", help="No server is running; allow CACHE_SYNC_MODE=off"),
+):
+    """Upsert questions from a file, streaming it in chunks"""
+    require_shared_versions(offline)
+    format = format or ("csv" if path.suffix.lower() == ".csv" else "ndjson")
+
+    async def run():
+        with path.open("rb") as f:
+            rows = server.parse_question_rows(server.iter_lines(server.aiter_items(f)), format)
+            return await server.import_questions(rows, chunk_size=chunk_size)
+
+    report = asyncio.run(run())
+    typer.echo(json.dumps(report.dict(), indent=2))
+    if report.rejected:
+        raise typer.Exit(code=1)
+
+
+@cli.command("backfill-question-hashes")
+def backfill_question_hashes(batch_size: int = typer.Option(1000, help="Questions per cursor batch and bulk write")):
+    """Give questions stored before content hashing a content_hash, so imports update them instead of copying"""
+    counts = asyncio.run(server.backfill_content_hashes(batch_size=batch_size))
+    typer.echo(f"Hashed {counts['hashed']} questions, {counts['duplicates']} duplicates left without a hash")
+    if counts["duplicates"]:
+        raise typer.Exit(code=1)
+
+
+@cli.command("compact-attempts")
+def compact_attempts(
+    older_than_days: float = typer.Option(server.attempt_compactor.max_age_days, help="Compact attempts older than this"),
+    archive_dir: Path = typer.Option(server.attempt_compactor.archive_dir, file_okay=False,
+                                     help="Directory for the gzipped NDJSON archives"),
+    batch_size: int = typer.Option(server.attempt_compactor.batch_size, help="Attempts per cursor batch"),
+):
+    """Roll old quiz attempts into daily summaries, archive them to disk and delete them"""
+    compactor = server.AttemptCompactor(max_age_days=older_than_days, archive_dir=archive_dir, batch_size=batch_size)
+    report = asyncio.run(compactor.run())
+    typer.echo(report.json(indent=2))
+
+
+@cli.command("regrade-attempts")
+def regrade_attempts(
+    question_ids: List[str] = typer.Argument(..., help="Questions whose correct_answer was fixed"),
+    batch_size: int = typer.Option(1000, help="Attempts per cursor batch and bulk write"),
+    offline: bool = typer.Option(False, "--offline", help="No server is running; allow CACHE_SYNC_MODE=off"),
+):
+    """Re-score stored attempts against the current answer key and correct the affected progress"""
+    require_shared_versions(offline)
+
+    def on_batch(report):
+        typer.echo(f"scanned {report.scanned}, regraded {report.regraded}, ungradable {report.ungradable}, "
+                   f"{report.attempts_per_second} attempts/s", err=True)
+
+    try:
+        report = asyncio.run(server.regrade_attempts(question_ids, batch_size=batch_size, on_batch=on_batch))
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(report.json(indent=2))
+
+
+@cli.command("export-attempts")
+def export_attempts(
+    output: Path = typer.Argument(..., dir_okay=False, help="File to write, or - for stdout"),
+    format: Optional[str] = typer.Option(None, help="ndjson, csv or parquet; guessed from the file extension by default"),
+    start: Optional[datetime] = typer.Option(None, help="Attempts completed at or after this time (UTC)"),
+    end: Optional[datetime] = typer.Option(None, help="Attempts completed before this time (UTC)"),
+    session_id: Optional[str] = typer.Option(None),
+    difficulty: Optional[server.DifficultyLevel] = typer.Option(None),
+    batch_size: int = typer.Option(server.EXPORT_BATCH_SIZE, help="Attempts per cursor batch and output chunk"),
+):
+    """Stream quiz attempts to a file without holding them in memory"""
+    format = format or {".csv": "csv", ".parquet": "parquet"}.get(output.suffix.lower(), "ndjson")
+    if format not in server.EXPORT_MEDIA_TYPES:
+        raise typer.BadParameter(f"unknown format {format!r}", param_hint="--format")
+    query = server.attempt_export_query(start, end, session_id, difficulty.value if difficulty else None)
+    started = time.perf_counter()
+
+    def on_batch(rows):
+        typer.echo(f"exported {rows} attempts, {rows / (time.perf_counter() - started):.1f} attempts/s", err=True)
+
+    async def run(f):
+        async for chunk in server.export_attempts(query, format, batch_size, on_batch=on_batch):
+            f.write(chunk)
+
+    if str(output) == "-":
+        asyncio.run(run(sys.stdout.buffer))
+    else:
+        with output.open("wb") as f:
+            asyncio.run(run(f))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,187 @@
+"""In-process inverted index for keyword search over the question bank.
+
+Questions are indexed on their text, options and explanation. Tokens are
+lowercased alphanumeric runs plus the dotted, colon or hyphenated compounds
+they form and any "/N" prefix length, so "OSPF", "10.0.0.0", "/26" and
+"192.168.1.0/26" all find what an instructor would expect. Every query term must match;
+results are ranked with BM25.
+
+Postings are append-only ``array`` columns of (slot, weight) that NumPy reads
+without copying, so a query is a handful of vectorised intersections and one
+partial sort however large the bank is. Re-indexing a question gives it a new
+slot and leaves the old one dead; ``QuestionSearchIndex.dead`` tells the owner
+when a rebuild is worth it. Re-adding a question whose indexed fields did not
+change is a no-op.
+"""
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Question text says what is asked, so it counts double against options and explanation
+FIELD_WEIGHTS = (("question_text", 2), ("options", 1), ("explanation", 1))
+STOPWORDS = frozenset(
+    "a an and are as at be by can does for from how in is it of on or the this to what when which who why with".split()
+)
+
+_COMPOUND = re.compile(r"[a-z0-9]+(?:[.:-]+[a-z0-9]+)+")
+_WORD = re.compile(r"[a-z0-9]+")
+_PREFIX_LENGTH = re.compile(r"/\d{1,3}\b")
+
+def tokenize(text: str) -> List[str]:
+    """Search terms in text, with repeats; the same function is used for documents and queries"""
+    text = text.lower()
+    tokens = [word for word in _WORD.findall(text) if word not in STOPWORDS]
+    tokens += _COMPOUND.findall(text)
+    tokens += _PREFIX_LENGTH.findall(text)
+    return tokens
+
+def _fingerprint(question: Dict[str, Any]) -> int:
+    return hash((question["topic"], question["difficulty_level"],
+                 *(str(question.get(field)) for field, _ in FIELD_WEIGHTS)))
+
+def _document_terms(question: Dict[str, Any]) -> Dict[str, int]:
+    terms: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        value = question.get(field) or ""
+        counts = Counter(tokenize(" ".join(value) if isinstance(value, list) else value))
+        if weight != 1:
+            counts = Counter({token: count * weight for token, count in counts.items()})
+        terms.update(counts)
+    return terms
+
+class QuestionSearchIndex:
+    """Inverted index from search term to question slots, with topic and difficulty columns for filtering"""
+
+    def __init__(self, capacity: int = 1024):
+        self._slots: Dict[str, int] = {}
+        self._fingerprints: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._topics: Dict[str, int] = {}
+        self._difficulties: Dict[str, int] = {}
+        self._topic_codes = np.zeros(capacity, dtype=np.int16)
+        self._difficulty_codes = np.zeros(capacity, dtype=np.int16)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._total_length = 0
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _grow(self):
+        capacity = len(self._alive) * 2
+        for name in ("_topic_codes", "_difficulty_codes", "_alive"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def add(self, questions: Iterable[Dict[str, Any]]):
+        """Index questions by id, replacing earlier versions of the same ids"""
+        for question in questions:
+            fingerprint = _fingerprint(question)
+            if self._fingerprints.get(question["id"]) == fingerprint:
+                continue
+            self._fingerprints[question["id"]] = fingerprint
+            terms = _document_terms(question)
+            length = sum(terms.values())
+            old = self._slots.get(question["id"])
+            if old is not None:
+                self._alive[old] = False
+                self.dead += 1
+            slot = len(self._ids)
+            if slot == len(self._alive):
+                self._grow()
+            self._ids.append(question["id"])
+            self._slots[question["id"]] = slot
+            self._topic_codes[slot] = self._topics.setdefault(question["topic"], len(self._topics) + 1)
+            self._difficulty_codes[slot] = self._difficulties.setdefault(
+                question["difficulty_level"], len(self._difficulties) + 1
+            )
+            self._alive[slot] = True
+            self._total_length += length
+
+            # BM25 term frequency part, fixed at indexing time against the current average length
+            average = self._total_length / len(self._ids)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+            for term, tf in terms.items():
+                slots, weights = self._postings.setdefault(term, (array("i"), array("f")))
+                slots.append(slot)
+                weights.append(tf * (BM25_K1 + 1) / (tf + norm))
+
+    def search(self, query: str, topic: Optional[str] = None, difficulty_level: Optional[str] = None,
+               offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[str, float]]]:
+        """Return the number of matches and one page of (question id, score), best first"""
+        terms = set(tokenize(query))
+        if not terms or any(term not in self._postings for term in terms):
+            return 0, []
+        if topic is not None and topic not in self._topics:
+            return 0, []
+        if difficulty_level is not None and difficulty_level not in self._difficulties:
+            return 0, []
+
+        count = len(self._slots)
+        # Rarest term first so every intersection shrinks the candidates
+        postings = sorted((self._postings[term] for term in terms), key=lambda p: len(p[0]))
+        slots = np.frombuffer(postings[0][0], dtype=np.int32)
+        scores = np.frombuffer(postings[0][1], dtype=np.float32) * self._idf(slots, count)
+        dense = present = None
+        for term_slots, term_weights in postings[1:]:
+            other = np.frombuffer(term_slots, dtype=np.int32)
+            idf = self._idf(other, count)
+            if len(slots) * 16 < len(other):
+                # Few candidates: binary search them in the longer list, which is in slot order
+                at = np.minimum(np.searchsorted(other, slots), len(other) - 1)
+                found = other[at] == slots
+                weights = np.frombuffer(term_weights, dtype=np.float32)[at[found]] * idf
+            else:
+                # Otherwise scatter the term into a dense row, with a mask of the slots it is in
+                if dense is None:
+                    dense = np.zeros(len(self._ids), dtype=np.float32)
+                    present = np.zeros(len(self._ids), dtype=bool)
+                dense[other] = np.frombuffer(term_weights, dtype=np.float32) * idf
+                present[other] = True
+                found = present[slots]
+                weights = dense[slots][found]
+                dense[other] = 0
+                present[other] = False
+            slots, scores = slots[found], scores[found] + weights
+            if not len(slots):
+                return 0, []
+
+        keep = self._alive[slots]
+        if topic is not None:
+            keep &= self._topic_codes[slots] == self._topics[topic]
+        if difficulty_level is not None:
+            keep &= self._difficulty_codes[slots] == self._difficulties[difficulty_level]
+        slots, scores = slots[keep], scores[keep]
+
+        end = offset + limit
+        if len(scores) > end > 0:
+            # Only the top `end` need sorting; ties at the cut stay in, in slot order
+            kth = -np.partition(-scores, end - 1)[end - 1]
+            top = np.flatnonzero(scores >= kth)
+            page_slots, page_scores = slots[top], scores[top]
+        else:
+            page_slots, page_scores = slots, scores
+        order = np.argsort(-page_scores, kind="stable")[offset:end]
+        return len(slots), [(self._ids[s], float(page_scores[i])) for i, s in zip(order, page_slots[order])]
+
+    def _idf(self, slots: np.ndarray, count: int) -> float:
+        # Document frequency over live slots only; dead ones would push it past count and the IDF below 0
+        matches = int(np.count_nonzero(self._alive[slots]))
+        return math.log(1 + (count - matches + 0.5) / (matches + 0.5))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "questions": len(self._slots),
+            "terms": len(self._postings),
+            "postings": sum(len(slots) for slots, _ in self._postings.values()),
+            "dead": self.dead,
+        }
@@ -1,24 +1,417 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne, ReturnDocument, UpdateOne
 import os
 import logging
+import math
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import numpy as np
+import orjson
+import pyarrow
+import pyarrow.parquet
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, Iterable, Callable
 import uuid
-from datetime import datetime, timezone
+import asyncio
+import cProfile
+import hmac
+from datetime import datetime, timedelta, timezone
 import random
+import time
+from collections import OrderedDict
+from brotli_asgi import BrotliMiddleware
+from contextvars import ContextVar
 from enum import Enum
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from search import QuestionSearchIndex
+from storage import RECENT_QUESTIONS_LIMIT, RECENT_SCORES_LIMIT, leaderboard_entry, open_storage
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+REQUEST_LATENCY = Histogram(
+    "netst_http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "netst_http_requests_in_flight", "HTTP requests currently being handled", ["method", "route"]
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "netst_mongo_command_duration_seconds", "MongoDB command latency", ["collection", "command", "outcome"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+)
+ATTEMPT_FLUSH_BATCH_SIZE = Histogram(
+    "netst_attempt_flush_batch_size", "Quiz attempts written per write-behind flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+ATTEMPT_QUEUE_LAG = Histogram(
+    "netst_attempt_queue_lag_seconds", "Age of the oldest quiz attempt in a write-behind flush"
+)
+ATTEMPT_QUEUE_DEPTH = Gauge("netst_attempt_queue_depth", "Quiz attempts waiting in the write-behind queue")
+
+class RequestTrace:
+    """Mongo command time spent on behalf of one request, keyed by collection.command"""
+
+    def __init__(self):
+        self.mongo_seconds = 0.0
+        self.commands: Dict[str, List[float]] = {}
+
+    def record(self, collection: str, command: str, seconds: float):
+        self.mongo_seconds += seconds
+        totals = self.commands.setdefault(f"{collection}.{command}" if collection else command, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def summary(self, elapsed: float) -> str:
+        # Concurrent commands overlap, so "python" is a floor on time spent off the wire
+        commands = sorted(self.commands.items(), key=lambda item: item[1][1], reverse=True)
+        breakdown = ", ".join(f"{name} {total * 1000:.1f} ms x{count}" for name, (count, total) in commands)
+        return (f"mongo {self.mongo_seconds * 1000:.1f} ms in {sum(c for c, _ in self.commands.values())} commands"
+                f"{f' ({breakdown})' if breakdown else ''}, "
+                f"python {max(0.0, elapsed - self.mongo_seconds) * 1000:.1f} ms")
+
+# Set per request while profiling is enabled; Motor copies the context into
+# its executor threads, so the command listener sees the request's trace
+request_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Record the duration of every Mongo command per collection and command name"""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event):
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name, outcome).observe(event.duration_micros / 1e6)
+        trace = request_trace.get()
+        if trace is not None:
+            trace.record(collection, event.command_name, event.duration_micros / 1e6)
+
+def route_template(scope) -> str:
+    """The path template of the route a request will hit, e.g. /api/progress/{session_id}"""
+    if "route_template" not in scope:
+        scope["route_template"] = "unmatched"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                scope["route_template"] = route.path
+                break
+    return scope["route_template"]
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight gauge, labelled with the route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+# Request profiling
+# Opt-in with REQUEST_PROFILING=true. Every request then carries a RequestTrace
+# and is logged with its Mongo vs. Python breakdown when it exceeds
+# SLOW_REQUEST_MS. Requests sampled at PROFILE_SAMPLE_RATE, or sent with an
+# X-Profile-Token header matching PROFILE_TOKEN, also run under cProfile and
+# leave a .prof file in PROFILE_DIR named after the route and duration
+# (snakeviz or flameprof render them as flame graphs). cProfile sees every
+# coroutine the loop runs while it is enabled, so only one request is
+# profiled at a time and a profile may include work from concurrent requests.
+class ProfilingMiddleware:
+    """Slow-request traces and on-demand cProfile dumps, see the section comment"""
+
+    def __init__(self, app, enabled: bool, profile_dir: Path, sample_rate: float = 0.0,
+                 token: str = "", slow_request_seconds: float = 1.0):
+        self.app = app
+        self.enabled = enabled
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.token = token.encode()
+        self.slow_request_seconds = slow_request_seconds
+        self._profiling = False
+
+    def _wants_profile(self, scope) -> bool:
+        if self._profiling:
+            return False
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _dump(self, profiler: cProfile.Profile, scope, elapsed: float) -> Path:
+        route = route_template(scope).strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / (
+            f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{scope['method']}_{route}"
+            f"_{elapsed * 1000:.0f}ms_{uuid.uuid4().hex[:6]}.prof"
+        )
+        profiler.dump_stats(path)
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        trace_token = request_trace.set(trace)
+        profiler = None
+        if self._wants_profile(scope):
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_trace.reset(trace_token)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                path = await asyncio.get_running_loop().run_in_executor(None, self._dump, profiler, scope, elapsed)
+                logger.info("Profiled %s %s in %.1f ms: %s", scope["method"], scope["path"], elapsed * 1000, path)
+            if elapsed >= self.slow_request_seconds:
+                logger.warning("Slow request %s %s took %.1f ms: %s", scope["method"], scope["path"],
+                               elapsed * 1000, trace.summary(elapsed))
+
+# Admission control
+# Expensive routes get a concurrency limit with a short bounded queue, and
+# optionally a token bucket per session, so a burst against one of them is
+# shed quickly instead of starving quiz/submit of the event loop and the
+# Mongo pool. Routes are configured as "METHOD /path/template=a:b" lists:
+#   ADMISSION_CONCURRENCY  a = requests running at once, b = requests waiting
+#   ADMISSION_RATE_LIMITS  a = requests per second per session, b = burst
+DEFAULT_ADMISSION_CONCURRENCY = (
+    "GET /api/questions/stats=4:16,GET /api/questions=16:64,POST /api/questions/import=1:0,"
+    "GET /api/leaderboard=16:64,GET /api/attempts/export=2:0"
+)
+DEFAULT_ADMISSION_RATE_LIMITS = "GET /api/questions/stats=2:10,GET /api/leaderboard=5:20"
+
+ADMISSION_REJECTED = Counter(
+    "netst_admission_rejected_total", "Requests shed by admission control", ["method", "route", "reason"]
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "netst_admission_queue_depth", "Requests waiting for a concurrency slot", ["method", "route"]
+)
+
+def parse_route_limits(spec: str) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, values = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        first, _, second = values.partition(":")
+        limits[(method.upper(), path.strip())] = (float(first), float(second or 0))
+    return limits
+
+class ConcurrencyLimit:
+    """At most ``limit`` requests at once; up to ``max_queue`` more wait at most ``timeout`` seconds"""
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+class TokenBuckets:
+    """One token bucket per key, refilled at ``rate`` per second up to ``burst``; least recently used keys are dropped"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Spend a token for key; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+class AdmissionControl:
+    """Per-route concurrency limits and per-session rate limits, looked up by route template"""
+
+    def __init__(self, concurrency: str = "", rate_limits: str = "", queue_timeout: float = 2.0):
+        self.configure(concurrency, rate_limits, queue_timeout)
+
+    def configure(self, concurrency: str = "", rate_limits: str = "", queue_timeout: float = 2.0):
+        self.queue_timeout = queue_timeout
+        self.concurrency = {
+            route: ConcurrencyLimit(int(limit), int(queue), queue_timeout)
+            for route, (limit, queue) in parse_route_limits(concurrency).items()
+        }
+        self.rate_limits = {
+            route: TokenBuckets(rate, burst) for route, (rate, burst) in parse_route_limits(rate_limits).items()
+        }
+
+def session_key(scope) -> str:
+    """Rate limit key: the session in the path or X-Session-Id header, else the client address"""
+    session_id = scope.get("path_params", {}).get("session_id")
+    if session_id is None:
+        session_id = dict(scope["headers"]).get(b"x-session-id", b"").decode("latin-1")
+    if session_id:
+        return f"session:{session_id}"
+    client = scope.get("client")
+    return f"client:{client[0] if client else ''}"
+
+class AdmissionMiddleware:
+    """Sheds requests over a route's rate or concurrency limit with 429/503 and Retry-After"""
+
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def _reject(self, send, status: int, retry_after: float, detail: str):
+        body = orjson.dumps({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["method"], route_template(scope))
+        buckets = self.control.rate_limits.get(key)
+        limit = self.control.concurrency.get(key)
+        if buckets is None and limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if buckets is not None:
+            for route in scope["app"].router.routes:
+                match, child_scope = route.matches(scope)
+                if match == Match.FULL:
+                    scope = {**scope, **child_scope}
+                    break
+            wait = buckets.take(session_key(scope))
+            if wait:
+                ADMISSION_REJECTED.labels(*key, "rate_limited").inc()
+                await self._reject(send, 429, wait, "Too many requests for this session")
+                return
+
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        depth = ADMISSION_QUEUE_DEPTH.labels(*key)
+        depth.inc()
+        try:
+            admitted = await limit.acquire()
+        finally:
+            depth.dec()
+        if not admitted:
+            ADMISSION_REJECTED.labels(*key, "overloaded").inc()
+            await self._reject(send, 503, limit.timeout, "Server is busy, try again shortly")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+admission = AdmissionControl(
+    concurrency=os.environ.get('ADMISSION_CONCURRENCY', DEFAULT_ADMISSION_CONCURRENCY),
+    rate_limits=os.environ.get('ADMISSION_RATE_LIMITS', DEFAULT_ADMISSION_RATE_LIMITS),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', 2000)) / 1000,
+)
+
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+# Each uvicorn worker gets its own client and pool, so size pools per worker
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    event_listeners=[MongoCommandMetrics()]
+)
+db = client[os.environ.get('DB_NAME', 'netst')]
+
+# Storage backend for the request path: mongo (default), sqlite or memory.
+# Cache sync across workers and the manage.py maintenance commands need mongo.
+storage = open_storage(
+    os.environ.get('STORAGE_BACKEND', 'mongo'),
+    db=db,
+    sqlite_path=os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'netst.sqlite3')),
+    session_ttl_seconds=int(os.environ.get('QUIZ_SESSION_TTL_SECONDS', 86400)),
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -70,11 +463,14 @@ class QuizAttempt(BaseModel):
     topic_filter: Optional[Topic] = None
     time_taken: int  # seconds
     completed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    answer_key: Optional[List[int]] = None  # Correct answers it was graded against
 
 class QuizStart(BaseModel):
     difficulty_level: DifficultyLevel
     topic_filter: Optional[Topic] = None
     question_count: int = 10
+    adaptive: bool = False  # Favour the session's weak topics and unseen questions
+    session_id: Optional[str] = None  # Required for adaptive quizzes
 
 class QuizSubmission(BaseModel):
     session_id: str
@@ -85,9 +481,14 @@ class QuizSubmission(BaseModel):
 class UserProgress(BaseModel):
     session_id: str
     total_quizzes: int = 0
+    total_score: float = 0.0
+    best_score: float = 0.0
     average_score: float = 0.0
     topics_attempted: Dict[str, int] = {}
     difficulty_progress: Dict[str, int] = {}
+    recent_scores: List[Dict[str, Any]] = []
+    topic_stats: Dict[str, Dict[str, int]] = {}  # topic -> {"answered": n, "correct": n}
+    recent_question_ids: List[str] = []
     weak_areas: List[str] = []
     last_activity: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -180,6 +581,1697 @@ SAMPLE_QUESTIONS = [
     }
 ]
 
+# Versioning
+class VersionCounters:
+    """Per-collection change counters, bumped on every write.
+
+    They make ETags that can be checked without reading Mongo, and callbacks
+    subscribed to a counter invalidate in-process caches when it moves.
+
+    With ``mode`` "off" the counters are local to the process. With "poll" or
+    "changestream" they live in one app_versions document shared by all
+    workers: bumps are ``$inc`` updates, and each worker picks up the others'
+    bumps by polling that document or by watching it with a change stream
+    (which needs a replica set). Counters moved on every request use
+    ``bump_later``, which folds all bumps within one poll interval into a
+    single ``$inc`` so submissions do not queue up on that one document.
+    """
+
+    MODES = ("off", "poll", "changestream")
+    DOC_ID = "versions"
+
+    def __init__(self, mode: str = "off", poll_interval: float = 1.0):
+        if mode not in self.MODES:
+            raise ValueError(f"CACHE_SYNC_MODE must be one of {', '.join(self.MODES)}, got {mode!r}")
+        self.mode = mode
+        self.poll_interval = poll_interval
+        # Local counters restart at zero with the process, so tags also carry an epoch
+        self.epoch = uuid.uuid4().hex[:8]
+        self._counters: Dict[str, int] = {}
+        self._listeners: Dict[str, List[Tuple[Callable[[], None], bool]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._deferred: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def get(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def subscribe(self, name: str, callback: Callable[[], None], include_local: bool = True):
+        """Call ``callback`` when ``name`` moves; with include_local=False only for other workers' writes"""
+        self._listeners.setdefault(name, []).append((callback, include_local))
+
+    def _notify(self, name: str, local: bool):
+        for callback, include_local in self._listeners.get(name, []):
+            if include_local or not local:
+                callback()
+
+    def _apply(self, doc: Dict[str, Any], local_name: Optional[str] = None, notify: bool = True):
+        if doc.get("epoch") != self.epoch:
+            # The shared document was recreated, so its counters restarted
+            self.epoch = doc.get("epoch", self.epoch)
+            self._counters = {}
+        for name, value in doc.items():
+            if name in ("_id", "epoch") or value <= self.get(name):
+                continue
+            local = name == local_name and value == self.get(name) + 1
+            self._counters[name] = value
+            if notify:
+                self._notify(name, local)
+
+    async def bump(self, name: str):
+        if self.mode == "off":
+            self._counters[name] = self.get(name) + 1
+            self._notify(name, local=True)
+            return
+
+        doc = await db.app_versions.find_one_and_update(
+            {"_id": self.DOC_ID},
+            {"$inc": {name: 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._apply(doc, local_name=name)
+
+    def bump_later(self, name: str):
+        """Bump ``name`` within one poll interval; this worker's ETag for it moves when the bump is written"""
+        if self.mode == "off":
+            self._counters[name] = self.get(name) + 1
+            self._notify(name, local=True)
+            return
+        self._deferred.add(name)
+
+    async def _flush_deferred(self):
+        names, self._deferred = self._deferred, set()
+        for name in names:
+            try:
+                await self.bump(name)
+            except PyMongoError:
+                logger.warning("Could not bump shared version counter %s, retrying", name, exc_info=True)
+                self._deferred.add(name)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._flush_deferred()
+
+    def etag(self, name: str) -> str:
+        return f'"{name}-{self.epoch}-{self.get(name)}"'
+
+    async def start(self):
+        if self.mode == "off" or self._task is not None:
+            return
+        doc = await db.app_versions.find_one_and_update(
+            {"_id": self.DOC_ID},
+            {"$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._apply(doc, notify=False)
+        self._task = asyncio.create_task(self._watch() if self.mode == "changestream" else self._poll())
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        for task in (self._task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._flush_task = None
+        if self._deferred:
+            await self._flush_deferred()
+
+    async def _refresh(self):
+        doc = await db.app_versions.find_one({"_id": self.DOC_ID})
+        if doc:
+            self._apply(doc)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._refresh()
+            except PyMongoError:
+                logger.warning("Could not read shared version counters", exc_info=True)
+
+    async def _watch(self):
+        pipeline = [{"$match": {"documentKey._id": self.DOC_ID}}]
+        while True:
+            try:
+                async with db.app_versions.watch(pipeline, full_document="updateLookup") as stream:
+                    # Catch up on anything written before the stream opened
+                    await self._refresh()
+                    async for change in stream:
+                        if change.get("fullDocument"):
+                            self._apply(change["fullDocument"])
+            except PyMongoError:
+                logger.warning("Version change stream failed, retrying", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+versions = VersionCounters(
+    mode=os.environ.get('CACHE_SYNC_MODE', 'off'),
+    poll_interval=float(os.environ.get('CACHE_SYNC_INTERVAL_SECONDS', 1)),
+)
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """Return a 304 when the client already holds the representation tagged ``etag``
+
+    If-None-Match uses weak comparison, so W/"..." matches too; proxies such
+    as nginx weaken the ETag when they compress the response.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or _opaque_tag(etag) in [_opaque_tag(t) for t in if_none_match.split(",")]
+    ):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+class WeakETagMiddleware:
+    """Mark ETags weak on content-encoded responses
+
+    ETags are computed over the identity body, so once the response is gzip
+    or br encoded a strong validator would claim byte equality it no longer
+    has (e.g. for a Range request). Place it just outside the compression
+    middleware.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_weak(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                if any(name.lower() == b"content-encoding" for name, _ in headers):
+                    message = {**message, "headers": [
+                        (name, b"W/" + value if name.lower() == b"etag" and not value.startswith(b"W/") else value)
+                        for name, value in headers
+                    ]}
+            await send(message)
+
+        await self.app(scope, receive, send_weak)
+
+# Question bank cache
+class QuestionBankCache:
+    """In-process copy of the question bank, partitioned by (difficulty, topic).
+
+    It is invalidated whenever the "questions" version counter is bumped; the
+    next read then reloads the whole bank with a single query. Banks larger than
+    ``max_size`` are not cached and ``get()`` returns None; those reads are
+    counted as bypasses rather than hits.
+    """
+
+    def __init__(self, max_size: int = 20000):
+        self.max_size = max_size
+        self.oversized = False
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._loaded_version: Optional[int] = None
+        self._partitions: Dict[Tuple[DifficultyLevel, Topic], List[Question]] = {}
+        self._by_difficulty: Dict[DifficultyLevel, List[Question]] = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def _load(self):
+        async with self._lock:
+            if self._loaded_version == self.version:
+                return
+            version = self.version
+            if await storage.count_questions() > self.max_size:
+                self._partitions = {}
+                self._by_difficulty = {}
+                self.oversized = True
+                self._loaded_version = version
+                return
+
+            docs = [doc async for doc in storage.iter_questions()]
+
+            partitions: Dict[Tuple[DifficultyLevel, Topic], List[Question]] = {}
+            by_difficulty: Dict[DifficultyLevel, List[Question]] = {}
+            for doc in docs:
+                question = Question(**doc)
+                partitions.setdefault((question.difficulty_level, question.topic), []).append(question)
+                by_difficulty.setdefault(question.difficulty_level, []).append(question)
+
+            self._partitions = partitions
+            self._by_difficulty = by_difficulty
+            self.oversized = False
+            # A write that raced with this load leaves the version ahead of
+            # what was read, so the next lookup reloads again.
+            self._loaded_version = version
+
+    async def get(self, difficulty_level: DifficultyLevel, topic: Optional[Topic] = None) -> Optional[List[Question]]:
+        if self._loaded_version != self.version:
+            self.misses += 1
+            await self._load()
+        elif self.oversized:
+            # Only the bank size is cached; the caller samples from storage
+            self.bypasses += 1
+        else:
+            self.hits += 1
+
+        if self.oversized:
+            return None
+        if topic is None:
+            return self._by_difficulty.get(difficulty_level, [])
+        return self._partitions.get((difficulty_level, topic), [])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_version": self._loaded_version,
+            "questions": sum(len(qs) for qs in self._by_difficulty.values()),
+            "partitions": len(self._partitions),
+            "oversized": self.oversized,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+        }
+
+question_bank = QuestionBankCache(max_size=int(os.environ.get('QUESTION_CACHE_MAX_SIZE', 20000)))
+versions.subscribe("questions", question_bank.invalidate)
+
+# Question search
+# The inverted index is built from the whole bank on first use and then kept
+# current by imports on this process; imports on other workers only mark it
+# stale, and the next search rebuilds it.
+SEARCH_FIELDS = ["id", "question_text", "options", "explanation", "topic", "difficulty_level"]
+SEARCH_BUILD_BATCH_SIZE = 1000
+# Share of dead slots left by re-indexed questions that triggers a rebuild
+SEARCH_MAX_DEAD_FRACTION = 0.25
+
+class QuestionSearch:
+    """Owns the in-process QuestionSearchIndex and keeps it in step with the bank
+
+    Only the first search waits for a build. Later rebuilds run in the
+    background while searches are answered from the previous index.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.builds = 0
+        self.queries = 0
+        self._index: Optional[QuestionSearchIndex] = None
+        self._loaded_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._rebuild: Optional[asyncio.Task] = None
+
+    def invalidate(self):
+        self.version += 1
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_version != self.version
+
+    async def _load(self):
+        async with self._lock:
+            if self._loaded_version == self.version:
+                return
+            version = self.version
+            index = QuestionSearchIndex(capacity=max(1024, await storage.count_questions()))
+            batch = []
+            async for doc in storage.iter_questions(fields=SEARCH_FIELDS, batch_size=SEARCH_BUILD_BATCH_SIZE):
+                batch.append(doc)
+                if len(batch) >= SEARCH_BUILD_BATCH_SIZE:
+                    # Tokenizing is CPU bound, keep it off the event loop
+                    await asyncio.to_thread(index.add, batch)
+                    batch = []
+            await asyncio.to_thread(index.add, batch)
+            self._index = index
+            self.builds += 1
+            # A write that raced with this build leaves the version ahead, so the next search rebuilds
+            self._loaded_version = version
+
+    async def update(self, content_hashes: List[str]):
+        """Re-index questions this process just wrote"""
+        if self._lock.locked():
+            self.invalidate()
+            return
+        if self._index is None or self.stale:
+            return
+        self._index.add(await storage.get_questions_by_hash(content_hashes))
+        if self._index.dead > SEARCH_MAX_DEAD_FRACTION * len(self._index):
+            self.invalidate()
+
+    async def _load_in_background(self):
+        try:
+            await self._load()
+        except Exception:
+            logger.exception("Rebuilding the search index failed; still serving the previous one")
+
+    async def search(self, query: str, topic: Optional[str] = None, difficulty_level: Optional[str] = None,
+                     offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[str, float]]]:
+        if self._index is None:
+            await self._load()
+        elif self.stale and (self._rebuild is None or self._rebuild.done()):
+            self._rebuild = asyncio.create_task(self._load_in_background())
+        self.queries += 1
+        return self._index.search(query, topic, difficulty_level, offset=offset, limit=limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_version": self._loaded_version,
+            "builds": self.builds,
+            "queries": self.queries,
+            **(self._index.stats() if self._index is not None else {}),
+        }
+
+question_search = QuestionSearch()
+versions.subscribe("questions", question_search.invalidate, include_local=False)
+
+# Question selection
+async def sample_questions(difficulty_level: DifficultyLevel, topic: Optional[Topic], count: int) -> List[Question]:
+    """Pick ``count`` random questions inside the storage backend and fetch only those"""
+    topic_value = topic.value if topic else None
+    available = await storage.count_questions(difficulty_level.value, topic_value)
+    if available < count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough questions available. Found {available}, requested {count}"
+        )
+
+    docs = await storage.sample_questions(difficulty_level.value, topic_value, count)
+    return [Question(**doc) for doc in docs]
+
+async def select_questions(difficulty_level: DifficultyLevel, topic: Optional[Topic], count: int) -> List[Question]:
+    """Pick random questions from the cached bank, or from Mongo when it is too large to cache"""
+    questions = await question_bank.get(difficulty_level, topic)
+    if questions is None:
+        return await sample_questions(difficulty_level, topic, count)
+
+    if len(questions) < count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough questions available. Found {len(questions)}, requested {count}"
+        )
+    return random.sample(questions, count)
+
+# Adaptive selection
+ADAPTIVE_MIN_TOPIC_WEIGHT = 0.1
+ADAPTIVE_PROBES = 8
+
+def pick_adaptive(pools: Dict[Topic, List[Question]], topic_stats: Dict[str, Dict[str, int]],
+                  seen: set, count: int) -> List[Question]:
+    """Draw ``count`` questions, favouring low-accuracy topics and questions not seen recently
+
+    Each slot picks a topic weighted by its error rate and then probes a few
+    random questions from that topic, so the cost is O(count), not O(bank).
+    """
+    available = {topic: len(pool) for topic, pool in pools.items() if pool}
+    if sum(available.values()) < count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough questions available. Found {sum(available.values())}, requested {count}"
+        )
+
+    weights = {
+        topic: max(ADAPTIVE_MIN_TOPIC_WEIGHT, 1 - topic_accuracy(topic_stats.get(topic.value, {})))
+        for topic in available
+    }
+    chosen: List[Question] = []
+    chosen_ids = set()
+    while len(chosen) < count:
+        topics = [topic for topic, left in available.items() if left > 0]
+        topic = random.choices(topics, [weights[t] for t in topics])[0]
+        pool = pools[topic]
+
+        pick = None
+        for _ in range(ADAPTIVE_PROBES):
+            candidate = random.choice(pool)
+            if candidate.id in chosen_ids:
+                continue
+            pick = candidate
+            if candidate.id not in seen:
+                break
+        if pick is None:
+            pick = random.choice([q for q in pool if q.id not in chosen_ids])
+
+        chosen.append(pick)
+        chosen_ids.add(pick.id)
+        available[topic] -= 1
+    return chosen
+
+async def select_adaptive_questions(difficulty_level: DifficultyLevel, topic_filter: Optional[Topic],
+                                    session_id: str, count: int) -> List[Question]:
+    progress = await storage.get_progress(session_id) or {}
+    topics = [topic_filter] if topic_filter else list(Topic)
+    pools = {topic: await question_bank.get(difficulty_level, topic) for topic in topics}
+    if any(pool is None for pool in pools.values()):
+        # The bank is too large to index in memory, fall back to uniform sampling
+        return await sample_questions(difficulty_level, topic_filter, count)
+    return pick_adaptive(pools, progress.get("topic_stats", {}), set(progress.get("recent_question_ids", [])), count)
+
+# Quiz session store
+class QuizSessionStore:
+    """Questions served per quiz, persisted with a TTL and fronted by a bounded LRU.
+
+    A quiz started on this process is graded without any storage read;
+    otherwise the session document and its questions cost one keyed lookup
+    plus one fetch by id. Each quiz is graded once: ``mark_submitted`` claims
+    it with a conditional update in storage and drops it from the LRU. A
+    questions bump empties the LRU and a session read from storage is graded
+    against the questions' current correct_answer, so a corrected answer key
+    also applies to quizzes started before it.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _remember(self, quiz_id: str, entry: Dict[str, Any]):
+        self._entries[quiz_id] = entry
+        self._entries.move_to_end(quiz_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def save(self, quiz_id: str, questions: List[Question], difficulty_level: DifficultyLevel,
+                   topic_filter: Optional[Topic], created_at: datetime):
+        doc = {
+            "id": quiz_id,
+            "question_ids": [q.id for q in questions],
+            "answer_key": [q.correct_answer for q in questions],
+            "difficulty_level": difficulty_level.value,
+            "topic_filter": topic_filter.value if topic_filter else None,
+            "created_at": created_at,
+        }
+        await storage.save_quiz_session(doc)
+        self._remember(quiz_id, {**doc, "questions": questions})
+
+    async def get(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(quiz_id)
+        if entry is not None:
+            age = (datetime.now(timezone.utc) - entry["created_at"]).total_seconds()
+            if age <= self.ttl_seconds:
+                self.hits += 1
+                self._entries.move_to_end(quiz_id)
+                return entry
+            del self._entries[quiz_id]
+
+        self.misses += 1
+        doc = await storage.get_quiz_session(quiz_id)
+        if doc is None:
+            return None
+        if "submitted_at" in doc:
+            # Already graded; the caller rejects the replay
+            return doc
+
+        docs = await storage.get_questions(doc["question_ids"])
+        by_id = {d["id"]: d for d in docs}
+        if len(by_id) != len(doc["question_ids"]):
+            # Questions were replaced since the quiz started (e.g. a re-seed)
+            return None
+
+        doc["questions"] = [Question(**by_id[qid]) for qid in doc["question_ids"]]
+        doc["answer_key"] = [q.correct_answer for q in doc["questions"]]
+        if doc["created_at"].tzinfo is None:
+            doc["created_at"] = doc["created_at"].replace(tzinfo=timezone.utc)
+        self._remember(quiz_id, doc)
+        return doc
+
+    def invalidate(self):
+        self._entries.clear()
+
+    async def mark_submitted(self, quiz_id: str) -> bool:
+        """Claim the quiz for grading; False if it was already submitted, here or on another worker"""
+        self._entries.pop(quiz_id, None)
+        return await storage.mark_quiz_submitted(quiz_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+quiz_sessions = QuizSessionStore(
+    max_entries=int(os.environ.get('QUIZ_SESSION_CACHE_SIZE', 10000)),
+    ttl_seconds=int(os.environ.get('QUIZ_SESSION_TTL_SECONDS', 86400)),
+)
+versions.subscribe("questions", quiz_sessions.invalidate)
+
+# User progress
+# One user_progress document per session, updated in place on every submission
+WEAK_AREA_MIN_ANSWERS = 5
+WEAK_AREA_MAX_ACCURACY = 0.6
+
+def topic_accuracy(stats: Dict[str, int]) -> float:
+    # Smoothed towards 50% so a couple of answers do not swing it to 0 or 1
+    return (stats.get("correct", 0) + 1) / (stats.get("answered", 0) + 2)
+
+def weak_areas(topic_stats: Dict[str, Dict[str, int]]) -> List[str]:
+    weak = [
+        topic for topic, stats in topic_stats.items()
+        if stats.get("answered", 0) >= WEAK_AREA_MIN_ANSWERS and topic_accuracy(stats) <= WEAK_AREA_MAX_ACCURACY
+    ]
+    return sorted(weak, key=lambda topic: topic_accuracy(topic_stats[topic]))
+
+def progress_response(progress: UserProgress) -> Dict[str, Any]:
+    average_score = progress.total_score / progress.total_quizzes if progress.total_quizzes else 0
+    return {
+        "session_id": progress.session_id,
+        "total_quizzes": progress.total_quizzes,
+        "average_score": round(average_score, 1),
+        "topics_attempted": progress.topics_attempted,
+        "difficulty_progress": progress.difficulty_progress,
+        "weak_areas": weak_areas(progress.topic_stats),
+        "recent_scores": progress.recent_scores
+    }
+
+def attempt_summary(attempt: Dict[str, Any], answer_key: Dict[str, Tuple[str, int]]) -> Dict[str, Any]:
+    """Reduce one stored attempt to the counters kept by user_progress and attempt_summaries"""
+    topic_stats: Dict[str, Dict[str, int]] = {}
+    user_answers = attempt.get("user_answers", [])
+    for i, question_id in enumerate(attempt.get("questions", [])):
+        if question_id not in answer_key:
+            continue
+        question_topic, correct_answer = answer_key[question_id]
+        stats = topic_stats.setdefault(question_topic, {"answered": 0, "correct": 0})
+        stats["answered"] += 1
+        stats["correct"] += int(i < len(user_answers) and user_answers[i] == correct_answer)
+    return {
+        "total_quizzes": 1,
+        "total_score": attempt["score"],
+        "best_score": attempt["score"],
+        "topics_attempted": {attempt.get("topic_filter") or "general": 1},
+        "difficulty_progress": {attempt["difficulty_level"]: 1},
+        "topic_stats": topic_stats,
+        "last_activity": attempt["completed_at"],
+    }
+
+def merge_summary(progress: UserProgress, summary: Dict[str, Any]):
+    """Add an attempt_summary() or attempt_summaries document into progress"""
+    progress.total_quizzes += summary.get("total_quizzes", 0)
+    progress.total_score += summary.get("total_score", 0)
+    progress.best_score = max(progress.best_score, summary.get("best_score", 0))
+    for topic, count in summary.get("topics_attempted", {}).items():
+        progress.topics_attempted[topic] = progress.topics_attempted.get(topic, 0) + count
+    for difficulty, count in summary.get("difficulty_progress", {}).items():
+        progress.difficulty_progress[difficulty] = progress.difficulty_progress.get(difficulty, 0) + count
+    for topic, stats in summary.get("topic_stats", {}).items():
+        merged = progress.topic_stats.setdefault(topic, {"answered": 0, "correct": 0})
+        merged["answered"] += stats.get("answered", 0)
+        merged["correct"] += stats.get("correct", 0)
+    progress.last_activity = max(progress.last_activity, summary["last_activity"])
+
+async def load_answer_key(question_ids: Optional[List[str]] = None) -> Dict[str, Tuple[str, int]]:
+    """Map question id to (topic, correct_answer) for the given questions, or the whole bank"""
+    query = {} if question_ids is None else {"id": {"$in": question_ids}}
+    return {
+        q["id"]: (q["topic"], q["correct_answer"])
+        async for q in db.questions.find(query, {"_id": 0, "id": 1, "topic": 1, "correct_answer": 1})
+    }
+
+async def rebuild_user_progress(batch_size: int = 500) -> int:
+    """Recompute every user_progress document from attempt_summaries and quiz_attempts, one session at a time
+
+    Submissions that land while a session is being rebuilt are lost from its progress.
+    """
+    pending = []
+    sessions = 0
+    progress: Optional[UserProgress] = None
+    recent_questions: List[List[str]] = []
+
+    async def flush(force: bool = False):
+        nonlocal pending
+        if pending and (force or len(pending) >= batch_size):
+            await db.user_progress.bulk_write(pending, ordered=False)
+            pending = []
+
+    def fold(progress: UserProgress, recent_questions: List[List[str]]):
+        # Collected newest attempt first; stored oldest first like the live $push
+        progress.recent_question_ids = [
+            qid for ids in reversed(recent_questions) for qid in ids
+        ][-RECENT_QUESTIONS_LIMIT:]
+        doc = progress.dict(exclude={"average_score", "weak_areas"})
+        pending.append(ReplaceOne({"session_id": progress.session_id}, doc, upsert=True))
+
+    # Compacted history arrives as daily summaries, merged by session_id alongside the raw attempts
+    summaries = db.attempt_summaries.find(
+        {}, {"_id": 0, "day": 0, "batches": 0}
+    ).sort([("session_id", 1)]).batch_size(batch_size)
+
+    async def next_summary() -> Optional[Dict[str, Any]]:
+        try:
+            return await summaries.next()
+        except StopAsyncIteration:
+            return None
+
+    summary = await next_summary()
+
+    async def next_session(session_id: Optional[str], last_activity: Optional[datetime] = None) -> Optional[UserProgress]:
+        """Store the finished session and any summary-only sessions before session_id, then start session_id"""
+        nonlocal summary, sessions
+        if progress is not None:
+            fold(progress, recent_questions)
+            await flush()
+        while summary is not None and (session_id is None or summary["session_id"] <= session_id):
+            current = UserProgress(session_id=summary["session_id"], last_activity=summary["last_activity"])
+            if current.session_id == session_id:
+                current.last_activity = max(current.last_activity, last_activity)
+            while summary is not None and summary["session_id"] == current.session_id:
+                merge_summary(current, summary)
+                summary = await next_summary()
+            sessions += 1
+            if current.session_id == session_id:
+                return current
+            fold(current, [])
+            await flush()
+        if session_id is None:
+            return None
+        sessions += 1
+        return UserProgress(session_id=session_id, last_activity=last_activity)
+
+    answer_key = await load_answer_key()
+    cursor = db.quiz_attempts.find(
+        {},
+        {"_id": 0, "session_id": 1, "score": 1, "topic_filter": 1, "difficulty_level": 1, "completed_at": 1,
+         "questions": 1, "user_answers": 1}
+    ).sort([("session_id", 1), ("completed_at", -1)]).batch_size(batch_size)
+
+    async for attempt in cursor:
+        if progress is None or attempt["session_id"] != progress.session_id:
+            # Attempts arrive newest first
+            progress = await next_session(attempt["session_id"], attempt["completed_at"])
+            recent_questions = []
+
+        difficulty = attempt["difficulty_level"]
+        if len(progress.recent_scores) < RECENT_SCORES_LIMIT:
+            progress.recent_scores.append(
+                {"score": attempt["score"], "date": attempt["completed_at"], "difficulty": difficulty}
+            )
+        if sum(map(len, recent_questions)) < RECENT_QUESTIONS_LIMIT:
+            recent_questions.append(attempt.get("questions", []))
+        merge_summary(progress, attempt_summary(attempt, answer_key))
+
+    await next_session(None)
+    await flush(force=True)
+    return sessions
+
+# Attempt compaction
+# Attempts older than max_age_days are rolled into one attempt_summaries
+# document per session and day, archived as gzipped NDJSON and deleted.
+# Each cursor batch is claimed with a compaction_batch marker before it is
+# archived, and a summary records the batches folded into it, so a run that
+# dies part way is finished by the next one without counting anything twice.
+# Rows may then appear twice in the archive, never in the summaries.
+SUMMARY_BATCH_HISTORY = 100
+
+class CompactionReport(BaseModel):
+    cutoff: datetime
+    archived: int = 0
+    deleted: int = 0
+    summaries: int = 0
+    archive_file: Optional[str] = None
+    elapsed_seconds: float = 0.0
+
+class AttemptCompactor:
+    """Rolls old quiz attempts into daily per-session summaries.
+
+    Runs on demand (``manage.py compact-attempts``) or, when ``interval`` is
+    set, every ``interval`` seconds in the background. Enable the background
+    loop on one process only.
+    """
+
+    def __init__(self, max_age_days: float = 90, archive_dir: Path = ROOT_DIR / "archive",
+                 interval: float = 0, batch_size: int = 1000):
+        self.max_age_days = max_age_days
+        self.archive_dir = Path(archive_dir)
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self, max_age_days: Optional[float] = None) -> CompactionReport:
+        started = time.perf_counter()
+        age = self.max_age_days if max_age_days is None else max_age_days
+        report = CompactionReport(cutoff=datetime.now(timezone.utc) - timedelta(days=age))
+        archive = self.archive_dir / f"quiz_attempts-{report.cutoff:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+
+        cursor = db.quiz_attempts.find(
+            {"completed_at": {"$lt": report.cutoff}}
+        ).sort([("completed_at", ASCENDING)]).batch_size(self.batch_size)
+        batch = []
+        async for attempt in cursor:
+            batch.append(attempt)
+            if len(batch) >= self.batch_size:
+                await self._compact(batch, archive, report)
+                batch = []
+        if batch:
+            await self._compact(batch, archive, report)
+
+        if report.archived:
+            report.archive_file = str(archive)
+        report.elapsed_seconds = round(time.perf_counter() - started, 3)
+        return report
+
+    async def _compact(self, attempts: List[Dict[str, Any]], archive: Path, report: CompactionReport):
+        # Claim unmarked rows; rows already marked belong to an interrupted run
+        unclaimed = [a["_id"] for a in attempts if "compaction_batch" not in a]
+        if unclaimed:
+            batch_id = uuid.uuid4().hex
+            await db.quiz_attempts.update_many(
+                {"_id": {"$in": unclaimed}, "compaction_batch": {"$exists": False}},
+                {"$set": {"compaction_batch": batch_id}}
+            )
+            claimed = {
+                doc["_id"] async for doc in db.quiz_attempts.find(
+                    {"_id": {"$in": unclaimed}, "compaction_batch": batch_id}, {"_id": 1}
+                )
+            }
+            attempts = [a for a in attempts if "compaction_batch" in a or a["_id"] in claimed]
+            for attempt in attempts:
+                attempt.setdefault("compaction_batch", batch_id)
+        if not attempts:
+            return
+
+        await asyncio.to_thread(self._append_archive, archive, attempts)
+        report.archived += len(attempts)
+        report.summaries += await self._summarize(attempts)
+        result = await db.quiz_attempts.delete_many({"_id": {"$in": [a["_id"] for a in attempts]}})
+        report.deleted += result.deleted_count
+
+    def _append_archive(self, archive: Path, attempts: List[Dict[str, Any]]):
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        lines = b"".join(
+            orjson.dumps({k: v for k, v in a.items() if k != "compaction_batch"},
+                         default=str, option=orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE)
+            for a in attempts
+        )
+        # One gzip member per batch; the file is still a single valid .gz stream
+        with open(archive, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                f.write(lines)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    async def _summarize(self, attempts: List[Dict[str, Any]]) -> int:
+        answer_key = await load_answer_key(list({qid for a in attempts for qid in a.get("questions", [])}))
+        daily: Dict[Tuple[str, datetime, str], UserProgress] = {}
+        for attempt in attempts:
+            day = attempt["completed_at"].replace(hour=0, minute=0, second=0, microsecond=0)
+            key = (attempt["session_id"], day, attempt["compaction_batch"])
+            if key not in daily:
+                daily[key] = UserProgress(session_id=attempt["session_id"], last_activity=attempt["completed_at"])
+            merge_summary(daily[key], attempt_summary(attempt, answer_key))
+
+        updates = []
+        for (session_id, day, batch_id), summary in daily.items():
+            increments = {"total_quizzes": summary.total_quizzes, "total_score": summary.total_score}
+            for field in ("topics_attempted", "difficulty_progress"):
+                for name, count in getattr(summary, field).items():
+                    increments[f"{field}.{name}"] = count
+            for topic, stats in summary.topic_stats.items():
+                increments[f"topic_stats.{topic}.answered"] = stats["answered"]
+                increments[f"topic_stats.{topic}.correct"] = stats["correct"]
+            updates.append(UpdateOne(
+                # Never matches a summary that already holds this batch; the upsert
+                # then collides with session_day_unique and the batch is skipped
+                {"session_id": session_id, "day": day, "batches": {"$ne": batch_id}},
+                {
+                    "$inc": increments,
+                    "$max": {"best_score": summary.best_score, "last_activity": summary.last_activity},
+                    "$push": {"batches": {"$each": [batch_id], "$slice": -SUMMARY_BATCH_HISTORY}},
+                },
+                upsert=True
+            ))
+        try:
+            await db.attempt_summaries.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        return len(updates)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await self.run()
+                if report.archived:
+                    logger.info("Compacted %d quiz attempts into %d summaries (%s)",
+                                report.archived, report.summaries, report.archive_file)
+            except Exception:
+                logger.exception("Quiz attempt compaction failed")
+
+attempt_compactor = AttemptCompactor(
+    max_age_days=float(os.environ.get('ATTEMPT_ARCHIVE_AFTER_DAYS', 90)),
+    archive_dir=Path(os.environ.get('ATTEMPT_ARCHIVE_DIR', ROOT_DIR / 'archive')),
+    interval=float(os.environ.get('ATTEMPT_COMPACTION_INTERVAL_SECONDS', 0)),
+    batch_size=int(os.environ.get('ATTEMPT_COMPACTION_BATCH_SIZE', 1000)),
+)
+
+# Re-grading
+# After an answer key is corrected, stored attempts that include the question
+# keep their old score. regrade_attempts() streams those attempts in batches,
+# grades each batch against the current answer key in one NumPy comparison,
+# writes back the ones whose result changed and applies the change to their
+# sessions' progress as $inc deltas, so submissions landing meanwhile are kept.
+# Attempts record the answer key they were graded against, so their change
+# per topic is exact. For attempts stored before that, a topic's correct count
+# can only be corrected when the corrected questions share one topic or were
+# all right or all wrong before; the others are counted in
+# topic_stats_unresolved and left for backfill-progress. Work and memory are
+# bounded per batch: sessions_updated counts a session once per batch it
+# appears in, and best scores lowered by a batch are fixed before the next.
+# Compacted attempts only survive in attempt_summaries and the archive, so
+# their part of progress is left as it was. Quizzes still in flight are
+# graded against the current key too, see QuizSessionStore.
+UNGRADABLE = -2
+BEST_SCORE_RETRIES = 3
+
+class RegradeReport(BaseModel):
+    question_ids: List[str]
+    scanned: int = 0
+    regraded: int = 0
+    ungradable: int = 0
+    sessions_updated: int = 0
+    topic_stats_unresolved: int = 0
+    question_stats: int = 0
+    elapsed_seconds: float = 0.0
+    attempts_per_second: float = 0.0
+
+def grade_attempts(attempts: List[Dict[str, Any]], key_index: Dict[str, int],
+                   answer_keys: np.ndarray) -> np.ndarray:
+    """Correct answers per attempt against answer_keys, or UNGRADABLE if a question left the bank"""
+    width = max((len(a["questions"]) for a in attempts), default=0)
+    # Padding points at a trailing slot whose key no answer can equal
+    slots = np.full((len(attempts), width), len(answer_keys), dtype=np.int64)
+    answers = np.full((len(attempts), width), -1, dtype=np.int64)
+    ungradable = np.zeros(len(attempts), dtype=bool)
+    for row, attempt in enumerate(attempts):
+        question_ids = attempt["questions"]
+        indexes = [key_index.get(qid, -1) for qid in question_ids]
+        ungradable[row] = -1 in indexes
+        slots[row, :len(indexes)] = indexes
+        given = [-1 if a is None else a for a in attempt.get("user_answers", [])[:len(question_ids)]]
+        answers[row, :len(given)] = given
+    keys = np.append(answer_keys, UNGRADABLE)[slots]
+    return np.where(ungradable, UNGRADABLE, (answers == keys).sum(axis=1))
+
+async def lower_best_score(session_id: str, lost: float):
+    """Recompute best_score after a regrade lowered a score of up to ``lost``
+
+    The write is conditional on best_score and total_quizzes being unchanged
+    since they were read, so a submission landing meanwhile is never undone.
+    Attempts still queued in the attempt writer are covered by recent_scores.
+    """
+    for _ in range(BEST_SCORE_RETRIES):
+        progress = await db.user_progress.find_one(
+            {"session_id": session_id}, {"_id": 0, "best_score": 1, "total_quizzes": 1, "recent_scores": 1}
+        )
+        if progress is None or progress.get("best_score", 0) > lost:
+            return
+        best = max([s["score"] for s in progress.get("recent_scores", [])], default=0)
+        async for doc in db.quiz_attempts.aggregate([
+            {"$match": {"session_id": session_id}}, {"$group": {"_id": None, "best": {"$max": "$score"}}}
+        ]):
+            best = max(best, doc["best"] or 0)
+        async for doc in db.attempt_summaries.aggregate([
+            {"$match": {"session_id": session_id}}, {"$group": {"_id": None, "best": {"$max": "$best_score"}}}
+        ]):
+            best = max(best, doc["best"] or 0)
+        result = await db.user_progress.update_one(
+            {"session_id": session_id, "best_score": progress["best_score"], "total_quizzes": progress["total_quizzes"]},
+            {"$set": {"best_score": best}}
+        )
+        if result.matched_count:
+            return
+    logger.warning("best_score of session %s kept changing, left at its current value", session_id)
+
+async def regrade_attempts(question_ids: List[str], batch_size: int = 1000,
+                           on_batch: Optional[Callable[[RegradeReport], None]] = None) -> RegradeReport:
+    """Re-score stored attempts containing question_ids and refresh what is derived from them"""
+    started = time.perf_counter()
+    report = RegradeReport(question_ids=question_ids)
+    answer_key = await load_answer_key()
+    unknown = [qid for qid in question_ids if qid not in answer_key]
+    if unknown:
+        raise ValueError(f"Unknown question ids: {', '.join(unknown)}")
+    key_index = {qid: i for i, qid in enumerate(answer_key)}
+    answer_keys = np.fromiter((correct for _, correct in answer_key.values()), dtype=np.int64, count=len(answer_key))
+
+    corrected = set(question_ids)
+
+    def topic_deltas(attempt: Dict[str, Any], correct_answers: int) -> Optional[Dict[str, int]]:
+        """Change in correct answers per topic, or None if the old split across topics is unknown"""
+        answers = attempt.get("user_answers", [])
+        graded = attempt.get("answer_key")
+        deltas: Dict[str, int] = {}
+        if graded is not None and len(graded) == len(attempt["questions"]):
+            for i, qid in enumerate(attempt["questions"]):
+                topic, key = answer_key[qid]
+                if graded[i] != key:
+                    given = answers[i] if i < len(answers) else None
+                    deltas[topic] = deltas.get(topic, 0) + int(given == key) - int(given == graded[i])
+            return deltas
+
+        new: Dict[str, int] = {}
+        changed = 0
+        for i, qid in enumerate(attempt["questions"]):
+            if qid in corrected:
+                topic, key = answer_key[qid]
+                new[topic] = new.get(topic, 0) + int(i < len(answers) and answers[i] == key)
+                changed += 1
+        # Only the corrected questions can have changed, so they account for the whole difference
+        was = attempt["correct_answers"] - (correct_answers - sum(new.values()))
+        if len(new) == 1:
+            [topic] = new
+            return {topic: new[topic] - was}
+        if was == 0 or was == changed:
+            per_question = was // changed
+            old: Dict[str, int] = {}
+            for qid in attempt["questions"]:
+                if qid in corrected:
+                    topic = answer_key[qid][0]
+                    old[topic] = old.get(topic, 0) + per_question
+            return {topic: new[topic] - old[topic] for topic in new}
+        return None
+
+    async def regrade(attempts: List[Dict[str, Any]]):
+        correct = grade_attempts(attempts, key_index, answer_keys)
+        updates, progress_updates, sessions = [], [], set()
+        # Highest score each session lost in this batch
+        lowered: Dict[str, float] = {}
+        for attempt, correct_answers in zip(attempts, correct.tolist()):
+            if correct_answers == UNGRADABLE:
+                report.ungradable += 1
+                continue
+            deltas = topic_deltas(attempt, correct_answers)
+            if deltas is None:
+                report.topic_stats_unresolved += 1
+            deltas = {topic: delta for topic, delta in (deltas or {}).items() if delta}
+            # A swap between topics changes topic_stats even when the total stays the same
+            if correct_answers == attempt["correct_answers"] and not deltas:
+                continue
+
+            score = correct_answers / len(attempt["questions"]) * 100
+            updates.append(UpdateOne({"_id": attempt["_id"]}, {"$set": {
+                "correct_answers": correct_answers,
+                "score": score,
+                "answer_key": [answer_key[qid][1] for qid in attempt["questions"]],
+            }}))
+            update: Dict[str, Any] = {"$inc": {f"topic_stats.{topic}.correct": delta for topic, delta in deltas.items()}}
+            array_filters = None
+            if score != attempt["score"]:
+                update["$inc"]["total_score"] = score - attempt["score"]
+                update["$set"] = {"recent_scores.$[entry].score": score}
+                array_filters = [{"entry.date": attempt["completed_at"]}]
+                if score > attempt["score"]:
+                    update["$max"] = {"best_score": score}
+                else:
+                    lowered[attempt["session_id"]] = max(lowered.get(attempt["session_id"], 0), attempt["score"])
+            progress_updates.append(UpdateOne({"session_id": attempt["session_id"]}, update,
+                                              array_filters=array_filters))
+            sessions.add(attempt["session_id"])
+        if updates:
+            await db.quiz_attempts.bulk_write(updates, ordered=False)
+            await db.user_progress.bulk_write(progress_updates, ordered=False)
+            for session_id, score in lowered.items():
+                await lower_best_score(session_id, score)
+            report.regraded += len(updates)
+            report.sessions_updated += len(sessions)
+        report.scanned += len(attempts)
+        report.elapsed_seconds = round(time.perf_counter() - started, 3)
+        if report.elapsed_seconds:
+            report.attempts_per_second = round(report.scanned / report.elapsed_seconds, 1)
+        if on_batch is not None:
+            on_batch(report)
+
+    cursor = db.quiz_attempts.find(
+        {"questions": {"$in": question_ids}},
+        {"_id": 1, "session_id": 1, "questions": 1, "user_answers": 1, "correct_answers": 1, "score": 1,
+         "completed_at": 1, "answer_key": 1}
+    ).batch_size(batch_size)
+    batch = []
+    async for attempt in cursor:
+        batch.append(attempt)
+        if len(batch) >= batch_size:
+            await regrade(batch)
+            batch = []
+    if batch:
+        await regrade(batch)
+
+    # question_stats keeps per-option counts, so correct follows the new key exactly, compacted history included
+    stats_updates = [
+        UpdateOne({"question_id": doc["question_id"]}, {"$set": {
+            "correct": doc.get("choices", {}).get(str(answer_key[doc["question_id"]][1]), 0)
+        }})
+        async for doc in db.question_stats.find(
+            {"question_id": {"$in": question_ids}}, {"_id": 0, "question_id": 1, "choices": 1}
+        )
+    ]
+    if stats_updates:
+        await db.question_stats.bulk_write(stats_updates, ordered=False)
+        report.question_stats = len(stats_updates)
+
+    if report.regraded:
+        leaderboard.invalidate()
+        await versions.bump("attempts")
+    # Quizzes in flight on every worker pick up the corrected key
+    await versions.bump("questions")
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    if report.elapsed_seconds:
+        report.attempts_per_second = round(report.scanned / report.elapsed_seconds, 1)
+    return report
+
+# Attempt export
+# Attempts are read from a projected cursor one batch at a time and encoded
+# per batch, so memory use depends on the batch size, not on the export size.
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))
+EXPORT_FIELDS = [
+    "id", "session_id", "completed_at", "difficulty_level", "topic_filter", "score",
+    "correct_answers", "total_questions", "time_taken", "questions", "user_answers",
+]
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what was written until drained, for streaming a Parquet file"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet records column chunk offsets from tell(), so it counts drained bytes too
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def attempt_export_query(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         session_id: Optional[str] = None, difficulty_level: Optional[str] = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if start or end:
+        query["completed_at"] = {k: v for k, v in (("$gte", start), ("$lt", end)) if v is not None}
+    if session_id:
+        query["session_id"] = session_id
+    if difficulty_level:
+        query["difficulty_level"] = difficulty_level
+    return query
+
+def _csv_rows(attempts: List[Dict[str, Any]], header: bool) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for attempt in attempts:
+        row = []
+        for field in EXPORT_FIELDS:
+            value = attempt.get(field)
+            if isinstance(value, list):
+                # Same | separated lists as the question import
+                value = "|".join(map(str, value))
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row.append(value)
+        writer.writerow(row)
+    return out.getvalue().encode()
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ("id", pyarrow.string()),
+        ("session_id", pyarrow.string()),
+        ("completed_at", pyarrow.timestamp("ms", tz="UTC")),
+        ("difficulty_level", pyarrow.string()),
+        ("topic_filter", pyarrow.string()),
+        ("score", pyarrow.float64()),
+        ("correct_answers", pyarrow.int32()),
+        ("total_questions", pyarrow.int32()),
+        ("time_taken", pyarrow.int64()),
+        ("questions", pyarrow.list_(pyarrow.string())),
+        ("user_answers", pyarrow.list_(pyarrow.int32())),
+    ])
+
+async def export_attempts(query: Dict[str, Any], format: str = "ndjson", batch_size: int = EXPORT_BATCH_SIZE,
+                          on_batch: Optional[Callable[[int], None]] = None) -> AsyncIterator[bytes]:
+    """Yield quiz_attempts matching query, oldest first, as one encoded chunk per cursor batch
+
+    Parquet chunks together form one file with a row group per batch.
+    """
+    cursor = db.quiz_attempts.find(
+        query, {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+    ).sort([("completed_at", ASCENDING)]).batch_size(batch_size)
+
+    sink = writer = None
+    if format == "parquet":
+        sink = ChunkSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, _parquet_schema())
+    rows = 0
+    while True:
+        attempts = await cursor.to_list(length=batch_size)
+        if not attempts:
+            break
+        if format == "ndjson":
+            chunk = b"".join(
+                orjson.dumps(a, option=orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE) for a in attempts
+            )
+        elif format == "csv":
+            chunk = _csv_rows(attempts, header=rows == 0)
+        else:
+            writer.write_table(pyarrow.Table.from_pylist(attempts, schema=writer.schema))
+            chunk = sink.drain()
+        rows += len(attempts)
+        if on_batch is not None:
+            on_batch(rows)
+        yield chunk
+
+    if format == "csv" and rows == 0:
+        yield _csv_rows([], header=True)
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+# Leaderboard
+class LeaderboardCache:
+    """Top sessions by average score, served from an in-process snapshot.
+
+    The snapshot is recomputed from user_progress at most every
+    ``max_staleness`` seconds, and concurrent misses share one recompute.
+    Submissions handled by this process are merged in as they happen.
+    """
+
+    def __init__(self, size: int = 10, min_quizzes: int = 3, max_staleness: float = 30.0):
+        self.size = size
+        self.min_quizzes = min_quizzes
+        self.max_staleness = max_staleness
+        self.hits = 0
+        self.misses = 0
+        self.recomputes = 0
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._computed_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+
+    async def _recompute(self):
+        self.recomputes += 1
+        self._entries = await storage.top_sessions(self.min_quizzes, self.size)
+        self._computed_at = time.monotonic()
+
+    def _clear_inflight(self, future: asyncio.Future):
+        if self._inflight is future:
+            self._inflight = None
+
+    async def get(self) -> List[Dict[str, Any]]:
+        if self._entries is not None and time.monotonic() - self._computed_at <= self.max_staleness:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if self._inflight is None:
+                self._inflight = asyncio.ensure_future(self._recompute())
+                self._inflight.add_done_callback(self._clear_inflight)
+            await asyncio.shield(self._inflight)
+
+        return [
+            {**entry, "rank": i + 1, "average_score": round(entry["average_score"], 1)}
+            for i, entry in enumerate(self._entries)
+        ]
+
+    def invalidate(self):
+        """Recompute on the next read"""
+        self._computed_at = float("-inf")
+
+    def record(self, progress: Dict[str, Any]):
+        """Merge a session's freshly updated progress into the snapshot"""
+        if self._entries is None or progress["total_quizzes"] < self.min_quizzes:
+            return
+
+        entry = leaderboard_entry(progress)
+        previous = next((e for e in self._entries if e["_id"] == entry["_id"]), None)
+        if (previous is not None and entry["average_score"] < previous["average_score"]
+                and len(self._entries) == self.size):
+            # A session outside the snapshot may now outrank it
+            self.invalidate()
+            return
+
+        entries = [e for e in self._entries if e["_id"] != entry["_id"]]
+        entries.append(entry)
+        entries.sort(key=lambda e: e["average_score"], reverse=True)
+        self._entries = entries[:self.size]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries or []),
+            "age_seconds": round(time.monotonic() - self._computed_at, 3) if self._entries is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recomputes": self.recomputes,
+        }
+
+# Attempt writer
+class AttemptWriter:
+    """Opt-in write-behind buffer for quiz attempt inserts.
+
+    Attempts are queued and written with one unordered ``insert_many`` once
+    ``batch_size`` are waiting or the oldest has waited ``max_delay`` seconds.
+    The queue is bounded, so when Mongo falls behind submissions wait for room.
+    A batch that still fails after the retries is logged and dropped. When
+    disabled, or if the flush task has stopped, every attempt is inserted
+    directly.
+    """
+
+    _STOP = object()
+
+    def __init__(self, enabled: bool = False, batch_size: int = 500, max_delay: float = 0.05,
+                 max_queue: int = 10000, max_retries: int = 3):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    def _running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    async def write(self, attempt: Dict[str, Any]):
+        if not self._running():
+            await storage.insert_attempts([attempt])
+            return
+        await self._queue.put((time.monotonic(), attempt))
+        ATTEMPT_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def drain(self):
+        """Flush everything still queued and stop; later writes go straight to storage"""
+        if self._task is None:
+            return
+        self._stopping = True
+        if not self._task.done():
+            await self._queue.put(self._STOP)
+            await self._task
+        elif not self._task.cancelled() and self._task.exception() is not None:
+            logger.error("Quiz attempt writer had stopped", exc_info=self._task.exception())
+        # Whatever a stopped flush task left behind is written directly
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not self._STOP:
+                leftover.append(item)
+        if leftover:
+            await self._flush(leftover)
+        self._task = None
+        self._stopping = False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is self._STOP:
+                break
+            batch = [first]
+            deadline = first[0] + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[float, Dict[str, Any]]]):
+        """Write one batch; never raises, so one bad batch cannot stop the writer"""
+        ATTEMPT_FLUSH_BATCH_SIZE.observe(len(batch))
+        ATTEMPT_QUEUE_LAG.observe(time.monotonic() - batch[0][0])
+        attempts = [attempt for _, attempt in batch]
+        for retry in range(self.max_retries + 1):
+            try:
+                await storage.insert_attempts(attempts)
+                break
+            except BulkWriteError as e:
+                # Per-document errors; retrying would not help
+                logger.error("Dropped %d of %d quiz attempts: %s",
+                             len(e.details.get("writeErrors", [])), len(attempts), e.details.get("writeErrors", [])[:1])
+                break
+            except PyMongoError:
+                if retry == self.max_retries:
+                    logger.exception("Dropped %d quiz attempts after %d retries", len(attempts), retry)
+                    break
+                await asyncio.sleep(0.1 * 2 ** retry)
+            except Exception:
+                # e.g. sqlite3.Error or an unencodable document; not transient
+                logger.exception("Dropped %d quiz attempts", len(attempts))
+                break
+        ATTEMPT_QUEUE_DEPTH.set(self._queue.qsize())
+
+attempt_writer = AttemptWriter(
+    enabled=os.environ.get('ATTEMPT_WRITE_BEHIND', 'false').lower() == 'true',
+    batch_size=int(os.environ.get('ATTEMPT_BATCH_SIZE', 500)),
+    max_delay=float(os.environ.get('ATTEMPT_BATCH_MAX_DELAY_MS', 50)) / 1000,
+    max_queue=int(os.environ.get('ATTEMPT_QUEUE_SIZE', 10000)),
+)
+
+leaderboard = LeaderboardCache(
+    size=int(os.environ.get('LEADERBOARD_SIZE', 10)),
+    max_staleness=float(os.environ.get('LEADERBOARD_MAX_STALENESS_SECONDS', 30)),
+)
+# Submissions on this process are merged in directly; other workers' only mark it stale
+versions.subscribe("attempts", leaderboard.invalidate, include_local=False)
+
+# Indexes
+# Applied at startup. Every query in HOT_QUERIES must be served by one of these.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "questions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("difficulty_level", ASCENDING), ("topic", ASCENDING)], name="difficulty_topic"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel(
+            [("content_hash", ASCENDING)], name="content_hash_unique", unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}}
+        ),
+        IndexModel(
+            [("difficulty_level", ASCENDING), ("topic", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="difficulty_topic_created_at_id"
+        ),
+    ],
+    "quiz_attempts": [
+        IndexModel([("session_id", ASCENDING), ("completed_at", DESCENDING)], name="session_recent"),
+        IndexModel([("completed_at", ASCENDING)], name="completed_at"),
+        # Multikey, for finding the attempts to re-grade after an answer key fix
+        IndexModel([("questions", ASCENDING)], name="questions"),
+    ],
+    "attempt_summaries": [
+        IndexModel([("session_id", ASCENDING), ("day", ASCENDING)], name="session_day_unique", unique=True),
+    ],
+    "quiz_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=quiz_sessions.ttl_seconds),
+    ],
+    "user_progress": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+        IndexModel([("total_quizzes", ASCENDING)], name="total_quizzes"),
+    ],
+    "question_stats": [
+        IndexModel([("question_id", ASCENDING)], name="question_id_unique", unique=True),
+        IndexModel([("topic", ASCENDING), ("difficulty_level", ASCENDING)], name="topic_difficulty"),
+    ],
+}
+
+# Representative filters for the queries routes run on every request
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"name": "quiz/start sample by difficulty", "collection": "questions",
+     "filter": {"difficulty_level": "beginner"}},
+    {"name": "quiz/start sample by difficulty and topic", "collection": "questions",
+     "filter": {"difficulty_level": "beginner", "topic": "subnetting"}},
+    {"name": "quiz/submit fetch served questions", "collection": "questions",
+     "filter": {"id": {"$in": ["a", "b"]}}},
+    {"name": "questions page", "collection": "questions",
+     "filter": {}, "sort": [("created_at", ASCENDING), ("id", ASCENDING)]},
+    {"name": "questions page by difficulty", "collection": "questions",
+     "filter": {"difficulty_level": "beginner"}, "sort": [("created_at", ASCENDING), ("id", ASCENDING)]},
+    {"name": "quiz/submit session lookup", "collection": "quiz_sessions",
+     "filter": {"id": "a"}},
+    {"name": "progress lookup", "collection": "user_progress",
+     "filter": {"session_id": "a"}},
+    {"name": "leaderboard qualifying sessions", "collection": "user_progress",
+     "filter": {"total_quizzes": {"$gte": 3}}},
+    {"name": "session attempts newest first", "collection": "quiz_attempts",
+     "filter": {"session_id": "a"}, "sort": [("completed_at", DESCENDING)]},
+]
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        existing = await db[collection].index_information()
+        for index in indexes:
+            spec = index.document
+            current = existing.get(spec["name"])
+            if (current is not None and "expireAfterSeconds" in spec
+                    and current.get("expireAfterSeconds") != spec["expireAfterSeconds"]):
+                # create_indexes rejects a changed TTL with IndexOptionsConflict; collMod changes it in place
+                await db.command("collMod", collection, index={
+                    "name": spec["name"], "expireAfterSeconds": spec["expireAfterSeconds"]
+                })
+                logger.info("Changed TTL of %s.%s from %s to %s seconds", collection, spec["name"],
+                            current.get("expireAfterSeconds"), spec["expireAfterSeconds"])
+        await db[collection].create_indexes(indexes)
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for child in plan.get("inputStages", []) + [plan[k] for k in ("inputStage", "queryPlan") if k in plan]:
+        yield from _plan_stages(child)
+
+async def find_collscans() -> List[str]:
+    """Explain every hot-path query and return the names of those that scan a whole collection"""
+    failures = []
+    for query in HOT_QUERIES:
+        cursor = db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        explain = await cursor.explain()
+        if "COLLSCAN" in _plan_stages(explain["queryPlanner"]["winningPlan"]):
+            failures.append(query["name"])
+    return failures
+
+# Admin routes
+# Routes that rewrite the bank or dump every session's answers need an
+# X-Admin-Token header matching ADMIN_TOKEN; without ADMIN_TOKEN they are off.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def require_admin_token(x_admin_token: str = Header("", description="Must match ADMIN_TOKEN")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Set ADMIN_TOKEN on the server to enable this endpoint")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Missing or invalid X-Admin-Token")
+
+# Question import
+# Questions are identified by a hash of their text and options, so re-importing
+# a corrected explanation, answer key, topic or difficulty updates in place.
+# Questions stored before hashing have none until manage.py
+# backfill-question-hashes gives them one; until then an import adds a copy.
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 50
+
+class ImportReport(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    errors: List[Dict[str, Any]] = []
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+def content_hash(question: QuestionCreate) -> str:
+    identity = [" ".join(question.question_text.split()), [" ".join(o.split()) for o in question.options]]
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return e
+
+async def backfill_content_hashes(batch_size: int = 1000) -> Dict[str, int]:
+    """Hash questions stored before content hashing, so imports and the seed upsert onto them
+
+    A question whose hash another question already holds is a duplicate; it
+    keeps no hash and is only counted, for someone to review and delete.
+    """
+    counts = {"hashed": 0, "duplicates": 0}
+    pending = []
+
+    async def flush():
+        try:
+            result = await db.questions.bulk_write(pending, ordered=False)
+            counts["hashed"] += result.modified_count
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            counts["hashed"] += e.details.get("nModified", 0)
+            counts["duplicates"] += len(errors)
+        pending.clear()
+
+    cursor = db.questions.find(
+        {"content_hash": {"$exists": False}}, {"_id": 0, "id": 1, "question_text": 1, "options": 1}
+    ).sort([("created_at", ASCENDING), ("id", ASCENDING)]).batch_size(batch_size)
+    # Oldest first, so of two identical questions the original keeps its id
+    async for doc in cursor:
+        question = QuestionCreate.model_construct(question_text=doc["question_text"], options=doc["options"])
+        pending.append(UpdateOne(
+            {"id": doc["id"], "content_hash": {"$exists": False}}, {"$set": {"content_hash": content_hash(question)}}
+        ))
+        if len(pending) >= batch_size:
+            await flush()
+    if pending:
+        await flush()
+    return counts
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Split a byte stream into str lines; a line that is not UTF-8 comes out as the UnicodeDecodeError"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode_line(line)
+    if buffer:
+        yield _decode_line(buffer)
+
+async def aiter_items(items: Iterable[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+async def parse_question_rows(lines: AsyncIterator[str], format: str) -> AsyncIterator[Any]:
+    """Turn NDJSON lines or CSV lines (header first, options separated by |) into row dicts
+
+    Records that cannot be parsed, and lines iter_lines could not decode, are
+    yielded as the exception, so the import can count them as rejected and
+    carry on.
+    """
+    if format == "ndjson":
+        async for line in lines:
+            if isinstance(line, Exception):
+                yield line
+            elif line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield e
+        return
+
+    header = None
+    pending = ""
+    async for line in lines:
+        if isinstance(line, Exception):
+            yield line
+            continue
+        pending += line.rstrip("\r\n") if not pending else "\n" + line.rstrip("\r\n")
+        # A record continues onto the next line while a quoted field is open
+        if pending.count('"') % 2 or not pending.strip():
+            continue
+        record, pending = pending, ""
+        try:
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+                continue
+            row = dict(zip(header, values))
+            options = row.get("options", "")
+            row["options"] = json.loads(options) if options.startswith("[") else options.split("|")
+        except (csv.Error, json.JSONDecodeError) as e:
+            yield e
+            continue
+        yield row
+    if pending.strip():
+        # An unbalanced quote swallowed everything after it
+        yield ValueError(f"Unterminated quoted field in record starting {pending[:80]!r}")
+
+async def import_questions(rows: AsyncIterator[Dict[str, Any]], chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportReport:
+    """Validate rows and upsert them on content hash, one storage write per chunk"""
+    report = ImportReport()
+    started = time.perf_counter()
+    operations = []
+    # True once a chunk changed the bank, or while a write that may have is in flight
+    changed = False
+
+    async def flush():
+        nonlocal changed
+        changed_before, changed = changed, True
+        inserted, updated, unchanged = await storage.upsert_questions(operations)
+        changed = changed_before or bool(inserted or updated)
+        if inserted or updated:
+            await question_search.update([q["content_hash"] for q in operations])
+        report.inserted += inserted
+        report.updated += updated
+        report.unchanged += unchanged
+        operations.clear()
+
+    try:
+        async for row in rows:
+            report.received += 1
+            try:
+                if isinstance(row, Exception):
+                    raise ValueError(f"Unparsable record: {row}")
+                question = QuestionCreate(**row)
+                if not 0 <= question.correct_answer < len(question.options):
+                    raise ValueError("correct_answer is not an index into options")
+            except (ValidationError, ValueError, TypeError) as e:
+                report.rejected += 1
+                if len(report.errors) < IMPORT_MAX_REPORTED_ERRORS:
+                    if isinstance(e, ValidationError):
+                        error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                    else:
+                        error = str(e)
+                    report.errors.append({"row": report.received, "error": error})
+                continue
+
+            operations.append({**question.dict(), "content_hash": content_hash(question)})
+            if len(operations) >= chunk_size:
+                await flush()
+
+        if operations:
+            await flush()
+    except BaseException:
+        if changed:
+            # Chunks committed before the failure never reached the search index
+            question_search.invalidate()
+        raise
+    finally:
+        # Committed chunks stay, so caches and ETags must move even when a later chunk failed
+        if changed:
+            await versions.bump("questions")
+
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    if report.elapsed_seconds:
+        report.rows_per_second = round(report.received / report.elapsed_seconds, 1)
+    logger.info(
+        "Imported questions: %d received, %d inserted, %d updated, %d unchanged, %d rejected in %.3fs",
+        report.received, report.inserted, report.updated, report.unchanged, report.rejected, report.elapsed_seconds
+    )
+    return report
+
 @api_router.get("/")
 async def root():
     return {"message": "neTst - CCNA Training Platform API"}
@@ -188,111 +2280,320 @@ async def root():
 async def seed_questions():
     """Seed the database with sample questions"""
     try:
-        # Clear existing questions
-        await db.questions.delete_many({})
+        # Upsert sample questions, leaving the rest of the bank in place
+        report = await import_questions(aiter_items(SAMPLE_QUESTIONS))
         
-        # Insert sample questions
-        questions = [Question(**q) for q in SAMPLE_QUESTIONS]
-        await db.questions.insert_many([q.dict() for q in questions])
+        return {"message": f"Successfully seeded {report.received - report.rejected} questions"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/questions/import", response_model=ImportReport, dependencies=[Depends(require_admin_token)])
+async def import_questions_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=10000)
+):
+    """Stream NDJSON or CSV questions from the request body into the bank"""
+    try:
+        rows = parse_question_rows(iter_lines(request.stream()), format)
+        return await import_questions(rows, chunk_size=chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Question listing
+QUESTION_STREAM_BATCH_SIZE = 500
+
+def encode_question_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_question_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Turn a page cursor back into the (created_at, id) position it was taken at"""
+    try:
+        created_at, question_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), question_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def question_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in Question.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The cursor is built from created_at and id, so they are always returned
+    return list(dict.fromkeys(requested + ["created_at", "id"]))
+
+QUESTIONS_CACHE_CONTROL = "public, no-cache"
+LEADERBOARD_CACHE_CONTROL = f"public, max-age={int(os.environ.get('LEADERBOARD_HTTP_MAX_AGE', 5))}"
+
+# Quiz results
+# The client already has question text, options and explanations from
+# quiz/start, so the compact result only carries ids, answers and a bitmap.
+COMPACT_RESULT_MEDIA_TYPE = "application/vnd.netst.compact+json"
+
+def correctness_bitmap(correct: List[bool]) -> str:
+    """Pack per-question correctness into base64, question i is bit i % 8 of byte i // 8"""
+    packed = bytearray((len(correct) + 7) // 8)
+    for i, is_correct in enumerate(correct):
+        if is_correct:
+            packed[i // 8] |= 1 << (i % 8)
+    return base64.b64encode(bytes(packed)).decode()
+
+@api_router.get("/questions", response_model=None)
+async def get_questions(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to get the whole bank"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    difficulty_level: Optional[DifficultyLevel] = None,
+    topic: Optional[Topic] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """List questions as one list, a keyset-paginated page, or an NDJSON stream
+
+    Stored documents were validated on write, so they are projected by the
+    storage backend and encoded with orjson as they are instead of being
+    rebuilt as Question models.
+    """
+    etag = versions.etag("questions")
+    cached = not_modified(request, etag, QUESTIONS_CACHE_CONTROL)
+    if cached:
+        return cached
+    headers = {"ETag": etag, "Cache-Control": QUESTIONS_CACHE_CONTROL}
+
+    query = {
+        "difficulty_level": difficulty_level.value if difficulty_level else None,
+        "topic": topic.value if topic else None,
+        "after": decode_question_cursor(cursor) if cursor else None,
+        "fields": question_fields(fields),
+    }
+
+    if format == "ndjson":
+        async def stream():
+            docs = storage.iter_questions(**query, batch_size=QUESTION_STREAM_BATCH_SIZE)
+            lines = []
+            async for doc in docs:
+                lines.append(orjson.dumps(doc))
+                if len(lines) >= QUESTION_STREAM_BATCH_SIZE:
+                    yield b"\n".join(lines) + b"\n"
+                    lines = []
+            if lines:
+                yield b"\n".join(lines) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+    if limit is None:
+        if fields or cursor:
+            raise HTTPException(status_code=400, detail="fields and cursor require limit or format=ndjson")
+        return ORJSONResponse(
+            [doc async for doc in storage.iter_questions(**query, batch_size=QUESTION_STREAM_BATCH_SIZE)],
+            headers=headers
+        )
+
+    docs = [doc async for doc in storage.iter_questions(**query, limit=limit + 1)]
+    next_cursor = encode_question_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return ORJSONResponse({"items": docs[:limit], "next_cursor": next_cursor}, headers=headers)
+
+@api_router.get("/questions/stats")
+async def get_question_stats(
+    topic: Optional[Topic] = None,
+    difficulty_level: Optional[DifficultyLevel] = None,
+    min_served: int = Query(0, ge=0, description="Skip questions served fewer times than this"),
+    sort_by: str = Query("accuracy", pattern="^(accuracy|served|correct|skipped)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Get per-question answer statistics, e.g. the hardest questions first"""
+    try:
+        return ORJSONResponse(await storage.question_stats(
+            topic=topic.value if topic else None,
+            difficulty_level=difficulty_level.value if difficulty_level else None,
+            min_served=min_served,
+            sort_by=sort_by,
+            descending=order == "desc",
+            limit=limit
+        ))
         
-        return {"message": f"Successfully seeded {len(questions)} questions"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/questions", response_model=List[Question])
-async def get_questions():
-    questions = await db.questions.find().to_list(length=None)
-    return [Question(**q) for q in questions]
+@api_router.get("/questions/search", response_model=None)
+async def search_questions(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Keywords; every one must match"),
+    topic: Optional[Topic] = None,
+    difficulty_level: Optional[DifficultyLevel] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+):
+    """Search question text, options and explanations, best match first"""
+    try:
+        etag = versions.etag("questions")
+        cached = not_modified(request, etag, QUESTIONS_CACHE_CONTROL)
+        if cached:
+            return cached
+
+        total, hits = await question_search.search(
+            q, topic.value if topic else None, difficulty_level.value if difficulty_level else None,
+            offset=offset, limit=limit
+        )
+        headers = {"Cache-Control": QUESTIONS_CACHE_CONTROL}
+        if not question_search.stale:
+            # Results from an index still being rebuilt must not be revalidated as current
+            headers["ETag"] = etag
+        docs = {doc["id"]: doc for doc in await storage.get_questions([question_id for question_id, _ in hits])}
+        items = [
+            {**{k: v for k, v in docs[question_id].items() if k != "content_hash"}, "score": round(score, 4)}
+            for question_id, score in hits if question_id in docs
+        ]
+        return ORJSONResponse({
+            "total": total,
+            "items": items,
+            "next_offset": offset + limit if offset + limit < total else None,
+        }, headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/quiz/start")
 async def start_quiz(quiz_config: QuizStart):
     """Start a new quiz with specified parameters"""
     try:
-        # Build query filter
-        query = {"difficulty_level": quiz_config.difficulty_level.value}
-        if quiz_config.topic_filter:
-            query["topic"] = quiz_config.topic_filter.value
-        
-        # Get available questions
-        questions = await db.questions.find(query).to_list(length=None)
-        
-        if len(questions) < quiz_config.question_count:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Not enough questions available. Found {len(questions)}, requested {quiz_config.question_count}"
-            )
-        
         # Randomly select questions
-        selected_questions = random.sample(questions, quiz_config.question_count)
+        if quiz_config.adaptive:
+            if not quiz_config.session_id:
+                raise HTTPException(status_code=400, detail="Adaptive quizzes require a session_id")
+            selected_questions = await select_adaptive_questions(
+                quiz_config.difficulty_level, quiz_config.topic_filter,
+                quiz_config.session_id, quiz_config.question_count
+            )
+        else:
+            selected_questions = await select_questions(
+                quiz_config.difficulty_level, quiz_config.topic_filter, quiz_config.question_count
+            )
         
         # Create quiz session
         quiz_session = {
             "id": str(uuid.uuid4()),
-            "questions": [Question(**q) for q in selected_questions],
+            "questions": [q.dict() for q in selected_questions],
             "difficulty_level": quiz_config.difficulty_level,
             "topic_filter": quiz_config.topic_filter,
             "created_at": datetime.now(timezone.utc)
         }
         
-        return quiz_session
+        # Remember what was served so the submission is graded against it
+        await quiz_sessions.save(
+            quiz_session["id"],
+            selected_questions,
+            quiz_config.difficulty_level,
+            quiz_config.topic_filter,
+            quiz_session["created_at"]
+        )
+        
+        return ORJSONResponse(quiz_session)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/quiz/submit")
-async def submit_quiz(submission: QuizSubmission):
+@api_router.post("/quiz/submit", response_model=None)
+async def submit_quiz(
+    submission: QuizSubmission,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(full|compact)$",
+                                  description="compact leaves out question text, options and explanations"),
+):
     """Submit quiz answers and get results"""
+    if format is None:
+        format = "compact" if COMPACT_RESULT_MEDIA_TYPE in request.headers.get("accept", "") else "full"
     try:
-        # Get the original quiz questions (you'd normally store this in a cache/session)
-        # For now, we'll reconstruct based on the difficulty and topic
-        query = {"difficulty_level": submission.quiz_id.split("_")[0] if "_" in submission.quiz_id else "beginner"}
-        questions = await db.questions.find(query).to_list(length=len(submission.answers))
+        # Get the questions that were served for this quiz
+        quiz = await quiz_sessions.get(submission.quiz_id)
         
-        if not questions:
-            raise HTTPException(status_code=404, detail="Quiz questions not found")
+        if quiz is None:
+            raise HTTPException(status_code=404, detail="Quiz not found or expired")
+        if "submitted_at" in quiz:
+            raise HTTPException(status_code=409, detail="Quiz already submitted")
         
-        # Calculate score
-        correct_answers = 0
-        results = []
+        questions = quiz["questions"]
+        if len(submission.answers) > len(questions):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Got {len(submission.answers)} answers for {len(questions)} questions"
+            )
         
-        for i, (question, user_answer) in enumerate(zip(questions, submission.answers)):
-            is_correct = user_answer == question["correct_answer"]
-            if is_correct:
-                correct_answers += 1
-            
-            results.append({
-                "question": question["question_text"],
-                "options": question["options"],
-                "user_answer": user_answer,
-                "correct_answer": question["correct_answer"],
-                "is_correct": is_correct,
-                "explanation": question["explanation"]
-            })
+        # Claim the quiz before recording anything, so a replay racing this one is rejected
+        if not await quiz_sessions.mark_submitted(submission.quiz_id):
+            raise HTTPException(status_code=409, detail="Quiz already submitted")
+        
+        # Calculate score, unanswered questions count as incorrect
+        answers = submission.answers + [None] * (len(questions) - len(submission.answers))
+        correct = [answer == key for answer, key in zip(answers, quiz["answer_key"])]
+        correct_answers = sum(correct)
         
-        score = (correct_answers / len(submission.answers)) * 100
+        score = (correct_answers / len(questions)) * 100
         
         # Store quiz attempt
         quiz_attempt = QuizAttempt(
             session_id=submission.session_id,
-            questions=[q["id"] for q in questions],
+            questions=quiz["question_ids"],
             user_answers=submission.answers,
             score=score,
-            total_questions=len(submission.answers),
+            total_questions=len(questions),
             correct_answers=correct_answers,
-            difficulty_level=DifficultyLevel(query["difficulty_level"]),
-            time_taken=submission.time_taken
+            difficulty_level=DifficultyLevel(quiz["difficulty_level"]),
+            topic_filter=quiz["topic_filter"],
+            time_taken=submission.time_taken,
+            answer_key=quiz["answer_key"]
         )
         
-        await db.quiz_attempts.insert_one(quiz_attempt.dict())
+        attempt = quiz_attempt.dict()
+        await attempt_writer.write(attempt)
+        await storage.record_answers(
+            [{"id": q.id, "topic": q.topic, "difficulty_level": q.difficulty_level} for q in questions],
+            answers,
+            correct
+        )
+        progress = await storage.record_progress(attempt, [q.topic.value for q in questions], correct)
+        leaderboard.record(progress)
+        # Coalesced across submissions; the leaderboard above already has this one
+        versions.bump_later("attempts")
         
-        return {
+        if format == "compact":
+            return ORJSONResponse({
+                "score": score,
+                "correct_answers": correct_answers,
+                "total_questions": len(questions),
+                "question_ids": quiz["question_ids"],
+                "user_answers": answers,
+                "answer_key": quiz["answer_key"],
+                "correct": correctness_bitmap(correct),
+                "time_taken": submission.time_taken
+            }, media_type=COMPACT_RESULT_MEDIA_TYPE, headers={"Vary": "Accept"})
+        
+        return ORJSONResponse({
             "score": score,
             "correct_answers": correct_answers,
-            "total_questions": len(submission.answers),
-            "results": results,
+            "total_questions": len(questions),
+            "results": [{
+                "question": question.question_text,
+                "options": question.options,
+                "user_answer": user_answer,
+                "correct_answer": correct_answer,
+                "is_correct": is_correct,
+                "explanation": question.explanation
+            } for question, user_answer, correct_answer, is_correct in zip(questions, answers, quiz["answer_key"], correct)],
             "time_taken": submission.time_taken
-        }
+        }, headers={"Vary": "Accept"})
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -300,99 +2601,77 @@ async def submit_quiz(submission: QuizSubmission):
 async def get_user_progress(session_id: str):
     """Get user progress based on session ID"""
     try:
-        attempts = await db.quiz_attempts.find({"session_id": session_id}).to_list(length=None)
-        
-        if not attempts:
-            return {
-                "session_id": session_id,
-                "total_quizzes": 0,
-                "average_score": 0,
-                "topics_attempted": {},
-                "difficulty_progress": {},
-                "recent_scores": []
-            }
-        
-        total_score = sum(attempt["score"] for attempt in attempts)
-        average_score = total_score / len(attempts)
-        
-        topics_attempted = {}
-        difficulty_progress = {}
-        recent_scores = []
+        doc = await storage.get_progress(session_id, exclude=("recent_question_ids",))
         
-        for attempt in attempts:
-            # Topic progress
-            topic = attempt.get("topic_filter", "general")
-            topics_attempted[topic] = topics_attempted.get(topic, 0) + 1
-            
-            # Difficulty progress
-            diff = attempt["difficulty_level"]
-            difficulty_progress[diff] = difficulty_progress.get(diff, 0) + 1
-            
-            # Recent scores
-            recent_scores.append({
-                "score": attempt["score"],
-                "date": attempt["completed_at"],
-                "difficulty": diff
-            })
-        
-        # Sort recent scores by date
-        recent_scores.sort(key=lambda x: x["date"], reverse=True)
-        recent_scores = recent_scores[:10]  # Keep last 10
+        if not doc:
+            return progress_response(UserProgress(session_id=session_id))
         
-        return {
-            "session_id": session_id,
-            "total_quizzes": len(attempts),
-            "average_score": round(average_score, 1),
-            "topics_attempted": topics_attempted,
-            "difficulty_progress": difficulty_progress,
-            "recent_scores": recent_scores
-        }
+        return progress_response(UserProgress(**doc))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/leaderboard")
-async def get_leaderboard():
+async def get_leaderboard(request: Request):
     """Get top performers across all sessions"""
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": "$session_id",
-                    "average_score": {"$avg": "$score"},
-                    "total_quizzes": {"$sum": 1},
-                    "best_score": {"$max": "$score"},
-                    "last_activity": {"$max": "$completed_at"}
-                }
-            },
-            {
-                "$match": {
-                    "total_quizzes": {"$gte": 3}  # At least 3 quizzes to qualify
-                }
-            },
-            {
-                "$sort": {"average_score": -1}
-            },
-            {
-                "$limit": 10
-            }
-        ]
+        etag = versions.etag("attempts")
+        cached = not_modified(request, etag, LEADERBOARD_CACHE_CONTROL)
+        if cached:
+            return cached
         
-        leaderboard = await db.quiz_attempts.aggregate(pipeline).to_list(length=None)
-        
-        # Add rankings
-        for i, entry in enumerate(leaderboard):
-            entry["rank"] = i + 1
-            entry["average_score"] = round(entry["average_score"], 1)
-        
-        return leaderboard
+        return ORJSONResponse(
+            await leaderboard.get(), headers={"ETag": etag, "Cache-Control": LEADERBOARD_CACHE_CONTROL}
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/attempts/export", response_model=None, dependencies=[Depends(require_admin_token)])
+async def export_attempts_endpoint(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    start: Optional[datetime] = Query(None, description="Attempts completed at or after this time"),
+    end: Optional[datetime] = Query(None, description="Attempts completed before this time"),
+    session_id: Optional[str] = None,
+    difficulty_level: Optional[DifficultyLevel] = None,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=50000),
+):
+    """Stream quiz attempts, oldest first, as NDJSON, CSV or Parquet"""
+    if storage.name != "mongo":
+        raise HTTPException(status_code=501, detail="Attempt export needs the mongo storage backend")
+
+    query = attempt_export_query(start, end, session_id, difficulty_level.value if difficulty_level else None)
+    return StreamingResponse(
+        export_attempts(query, format, batch_size),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="quiz_attempts.{format}"'}
+    )
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters for the in-process caches"""
+    return {
+        "question_bank": question_bank.stats(),
+        "quiz_sessions": quiz_sessions.stats(),
+        "leaderboard": leaderboard.stats(),
+        "question_search": question_search.stats(),
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1000))
+
+# Innermost, so compression time shows up in the latency metrics; gzip for clients without br
+app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+app.add_middleware(WeakETagMiddleware)
+# Inside CORS so shed requests still carry CORS headers; outside metrics so they are counted
+app.add_middleware(AdmissionMiddleware, control=admission)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -400,6 +2679,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Outermost, so profiling overhead stays out of the latency metrics
+app.add_middleware(
+    ProfilingMiddleware,
+    enabled=os.environ.get('REQUEST_PROFILING', 'false').lower() == 'true',
+    profile_dir=Path(os.environ.get('PROFILE_DIR', ROOT_DIR / 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    token=os.environ.get('PROFILE_TOKEN', ''),
+    slow_request_seconds=float(os.environ.get('SLOW_REQUEST_MS', 1000)) / 1000,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -408,6 +2697,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await storage.start()
+    if storage.name == "mongo":
+        await ensure_indexes()
+        attempt_compactor.start()
+    elif versions.mode != "off":
+        raise RuntimeError(f"CACHE_SYNC_MODE={versions.mode} needs STORAGE_BACKEND=mongo")
+    await versions.start()
+    attempt_writer.start()
+    if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 and versions.mode == "off":
+        logger.warning("Running several workers with CACHE_SYNC_MODE=off; in-process caches will diverge")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await attempt_compactor.stop()
+    await attempt_writer.drain()
+    await versions.stop()
+    await storage.close()
+    client.close()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 8001)),
+        workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+    )
\ No newline at end of file
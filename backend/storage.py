@@ -0,0 +1,794 @@
+"""Storage backends for the quiz API.
+
+The request path (seed/import, listing, sampling, grading, progress and the
+leaderboard) goes through a ``Storage`` instead of Motor collections:
+
+- ``MotorStorage``: MongoDB through Motor, the production backend
+- ``SQLiteStorage``: one SQLite file with indexes mirroring the Mongo ones,
+  for small single-process deployments without a MongoDB
+- ``MemoryStorage``: plain dicts in this process, for tests and demos
+
+Documents go in and come out as plain dicts shaped like the Mongo documents:
+enums as their values, datetimes as naive UTC with millisecond precision and
+no ``_id``. Counter updates are written once as Mongo update documents;
+MotorStorage sends them to the server and the other backends apply them with
+``apply_update``, so all three keep identical shapes.
+"""
+import abc
+import asyncio
+import copy
+import random
+import sqlite3
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+RECENT_SCORES_LIMIT = 10
+RECENT_QUESTIONS_LIMIT = 200
+QUESTION_SORT_FIELDS = ("created_at", "id")
+QUESTION_STATS_SORT_FIELDS = ("accuracy", "served", "correct", "skipped")
+PROGRESS_SUMMARY_FIELDS = ("session_id", "total_quizzes", "total_score", "best_score", "last_activity")
+
+def to_stored(value: Any) -> Any:
+    """Normalise a value the way a BSON round trip would"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {k: to_stored(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_stored(v) for v in value]
+    return value
+
+def project(doc: Dict[str, Any], fields: Optional[List[str]] = None, exclude: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    if fields is not None:
+        return {k: doc[k] for k in fields if k in doc}
+    return {k: v for k, v in doc.items() if k not in exclude}
+
+# Update documents
+def progress_update(attempt: Dict[str, Any], question_topics: List[str], correct: List[bool]) -> Dict[str, Any]:
+    """Build the atomic update that folds one attempt into a session's progress"""
+    topic = attempt.get("topic_filter") or "general"
+    difficulty = attempt["difficulty_level"]
+    increments = {
+        "total_quizzes": 1,
+        "total_score": attempt["score"],
+        f"topics_attempted.{topic}": 1,
+        f"difficulty_progress.{difficulty}": 1,
+    }
+    for question_topic, is_correct in zip(question_topics, correct):
+        stats = f"topic_stats.{question_topic}"
+        increments[f"{stats}.answered"] = increments.get(f"{stats}.answered", 0) + 1
+        increments[f"{stats}.correct"] = increments.get(f"{stats}.correct", 0) + int(is_correct)
+
+    return {
+        "$inc": increments,
+        "$push": {
+            "recent_scores": {
+                "$each": [{"score": attempt["score"], "date": attempt["completed_at"], "difficulty": difficulty}],
+                "$sort": {"date": -1},
+                "$slice": RECENT_SCORES_LIMIT,
+            },
+            "recent_question_ids": {
+                "$each": list(attempt["questions"]),
+                "$slice": -RECENT_QUESTIONS_LIMIT,
+            },
+        },
+        "$max": {"last_activity": attempt["completed_at"], "best_score": attempt["score"]},
+    }
+
+def question_stats_update(question: Dict[str, Any], answer: Optional[int], is_correct: bool) -> Dict[str, Any]:
+    """One question_stats document per question: times served, answered correctly, skipped, and per option chosen"""
+    update: Dict[str, Any] = {
+        "$inc": {"served": 1, "correct": int(is_correct), "skipped": int(answer is None)},
+        "$set": {"topic": question["topic"], "difficulty_level": question["difficulty_level"]},
+    }
+    if answer is None:
+        update["$setOnInsert"] = {"choices": {}}
+    else:
+        update["$inc"][f"choices.{answer}"] = 1
+    return update
+
+def question_upsert(question: Dict[str, Any]) -> Dict[str, Any]:
+    """Upsert keyed on content_hash: refresh the content, keep id and created_at of the first import"""
+    return {
+        "$set": {k: v for k, v in question.items() if k != "content_hash"},
+        "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc)},
+    }
+
+def _parent(doc: Dict[str, Any], path: str) -> Tuple[Dict[str, Any], str]:
+    *parents, leaf = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    return doc, leaf
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserted: bool = False) -> Dict[str, Any]:
+    """Apply the subset of Mongo update operators used above to a plain document, in place"""
+    for operator, fields in update.items():
+        if operator == "$setOnInsert" and not inserted:
+            continue
+        for path, value in to_stored(fields).items():
+            parent, key = _parent(doc, path)
+            if operator in ("$set", "$setOnInsert"):
+                parent[key] = value
+            elif operator == "$inc":
+                parent[key] = parent.get(key, 0) + value
+            elif operator == "$max":
+                if key not in parent or value > parent[key]:
+                    parent[key] = value
+            elif operator == "$push":
+                items = parent.get(key, []) + value["$each"]
+                for field, direction in value.get("$sort", {}).items():
+                    items.sort(key=lambda item: item[field], reverse=direction < 0)
+                if "$slice" in value:
+                    items = items[:value["$slice"]] if value["$slice"] >= 0 else items[value["$slice"]:]
+                parent[key] = items
+            else:
+                raise ValueError(f"Unsupported update operator {operator}")
+    return doc
+
+def leaderboard_entry(progress: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "_id": progress["session_id"],
+        "average_score": progress["total_score"] / progress["total_quizzes"],
+        "total_quizzes": progress["total_quizzes"],
+        "best_score": progress.get("best_score", 0.0),
+        "last_activity": progress.get("last_activity"),
+    }
+
+def with_accuracy(stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {**stats, "accuracy": stats["correct"] / stats["served"]}
+
+class Storage(abc.ABC):
+    """Operations the request path needs; every backend implements all of them"""
+
+    name = ""
+
+    def __init__(self, session_ttl_seconds: int = 86400):
+        self.session_ttl_seconds = session_ttl_seconds
+
+    def _session_cutoff(self) -> datetime:
+        return to_stored(datetime.now(timezone.utc) - timedelta(seconds=self.session_ttl_seconds))
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Questions
+    @abc.abstractmethod
+    async def count_questions(self, difficulty_level: Optional[str] = None, topic: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def sample_questions(self, difficulty_level: str, topic: Optional[str], count: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_questions(self, ids: List[str]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_questions_by_hash(self, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_questions(self, difficulty_level: Optional[str] = None, topic: Optional[str] = None,
+                       after: Optional[Tuple[datetime, str]] = None, fields: Optional[List[str]] = None,
+                       limit: Optional[int] = None, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Questions in (created_at, id) order, strictly after ``after``; all fields but content_hash by default"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def upsert_questions(self, questions: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Upsert on content_hash; returns (inserted, updated, unchanged)"""
+        raise NotImplementedError
+
+    # Quiz sessions
+    @abc.abstractmethod
+    async def save_quiz_session(self, session: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_quiz_session(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def mark_quiz_submitted(self, quiz_id: str) -> bool:
+        """Set submitted_at on an unexpired, unsubmitted session; False if it was already submitted or is gone"""
+        raise NotImplementedError
+
+    # Attempts and statistics
+    @abc.abstractmethod
+    async def insert_attempts(self, attempts: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def record_answers(self, questions: List[Dict[str, Any]], answers: List[Optional[int]],
+                             correct: List[bool]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def question_stats(self, topic: Optional[str] = None, difficulty_level: Optional[str] = None,
+                             min_served: int = 0, sort_by: str = "accuracy", descending: bool = False,
+                             limit: int = 50) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    # Progress
+    @abc.abstractmethod
+    async def record_progress(self, attempt: Dict[str, Any], question_topics: List[str],
+                              correct: List[bool]) -> Dict[str, Any]:
+        """Fold an attempt into its session's progress and return PROGRESS_SUMMARY_FIELDS of the result"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_progress(self, session_id: str, exclude: Tuple[str, ...] = ()) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def top_sessions(self, min_quizzes: int, limit: int) -> List[Dict[str, Any]]:
+        """Leaderboard entries for sessions with at least min_quizzes, best average first"""
+        raise NotImplementedError
+
+class MotorStorage(Storage):
+    name = "mongo"
+
+    def __init__(self, db, session_ttl_seconds: int = 86400):
+        super().__init__(session_ttl_seconds)
+        self.db = db
+
+    async def count_questions(self, difficulty_level=None, topic=None):
+        query = {k: v for k, v in (("difficulty_level", difficulty_level), ("topic", topic)) if v}
+        if not query:
+            return await self.db.questions.estimated_document_count()
+        return await self.db.questions.count_documents(query)
+
+    async def sample_questions(self, difficulty_level, topic, count):
+        query = {"difficulty_level": difficulty_level}
+        if topic:
+            query["topic"] = topic
+        pipeline = [
+            {"$match": query},
+            {"$sample": {"size": count}},
+            {"$project": {"_id": 0}},
+        ]
+        return await self.db.questions.aggregate(pipeline).to_list(length=count)
+
+    async def get_questions(self, ids):
+        return await self.db.questions.find({"id": {"$in": ids}}, {"_id": 0}).to_list(length=None)
+
+    async def get_questions_by_hash(self, content_hashes):
+        return await self.db.questions.find(
+            {"content_hash": {"$in": content_hashes}}, {"_id": 0}
+        ).to_list(length=None)
+
+    async def iter_questions(self, difficulty_level=None, topic=None, after=None, fields=None, limit=None,
+                             batch_size=500):
+        query: Dict[str, Any] = {k: v for k, v in (("difficulty_level", difficulty_level), ("topic", topic)) if v}
+        if after is not None:
+            created_at, question_id = after
+            query["$or"] = [
+                {"created_at": {"$gt": created_at}},
+                {"created_at": created_at, "id": {"$gt": question_id}},
+            ]
+        projection = {"_id": 0, **{f: 1 for f in fields}} if fields is not None else {"_id": 0, "content_hash": 0}
+        cursor = self.db.questions.find(query, projection).sort(
+            [(f, ASCENDING) for f in QUESTION_SORT_FIELDS]
+        ).batch_size(batch_size if limit is None else min(batch_size, limit))
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        async for doc in cursor:
+            yield doc
+
+    async def upsert_questions(self, questions):
+        operations = [
+            UpdateOne({"content_hash": q["content_hash"]}, question_upsert(q), upsert=True) for q in questions
+        ]
+        result = await self.db.questions.bulk_write(operations, ordered=False)
+        return result.upserted_count, result.modified_count, result.matched_count - result.modified_count
+
+    async def save_quiz_session(self, session):
+        await self.db.quiz_sessions.insert_one(dict(session))
+
+    async def get_quiz_session(self, quiz_id):
+        # The TTL monitor only runs once a minute, so expired sessions may still be there
+        return await self.db.quiz_sessions.find_one(
+            {"id": quiz_id, "created_at": {"$gte": self._session_cutoff()}}, {"_id": 0}
+        )
+
+    async def mark_quiz_submitted(self, quiz_id):
+        result = await self.db.quiz_sessions.update_one(
+            {"id": quiz_id, "created_at": {"$gte": self._session_cutoff()}, "submitted_at": {"$exists": False}},
+            {"$set": {"submitted_at": to_stored(datetime.now(timezone.utc))}}
+        )
+        return result.modified_count == 1
+
+    async def insert_attempts(self, attempts):
+        if len(attempts) == 1:
+            await self.db.quiz_attempts.insert_one(attempts[0])
+        else:
+            await self.db.quiz_attempts.insert_many(attempts, ordered=False)
+
+    async def record_answers(self, questions, answers, correct):
+        await self.db.question_stats.bulk_write([
+            UpdateOne({"question_id": question["id"]}, question_stats_update(question, answer, is_correct), upsert=True)
+            for question, answer, is_correct in zip(to_stored(questions), answers, correct)
+        ], ordered=False)
+
+    async def question_stats(self, topic=None, difficulty_level=None, min_served=0, sort_by="accuracy",
+                             descending=False, limit=50):
+        match: Dict[str, Any] = {k: v for k, v in (("topic", topic), ("difficulty_level", difficulty_level)) if v}
+        if min_served:
+            match["served"] = {"$gte": min_served}
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {"accuracy": {"$divide": ["$correct", "$served"]}}},
+            {"$sort": {sort_by: DESCENDING if descending else ASCENDING, "question_id": ASCENDING}},
+            {"$limit": limit},
+            {"$project": {"_id": 0}}
+        ]
+        return await self.db.question_stats.aggregate(pipeline).to_list(length=limit)
+
+    async def record_progress(self, attempt, question_topics, correct):
+        return await self.db.user_progress.find_one_and_update(
+            {"session_id": attempt["session_id"]},
+            progress_update(to_stored(attempt), question_topics, correct),
+            projection={"_id": 0, **{f: 1 for f in PROGRESS_SUMMARY_FIELDS}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def get_progress(self, session_id, exclude=()):
+        return await self.db.user_progress.find_one(
+            {"session_id": session_id}, {"_id": 0, **{f: 0 for f in exclude}}
+        )
+
+    async def top_sessions(self, min_quizzes, limit):
+        pipeline = [
+            {"$match": {"total_quizzes": {"$gte": min_quizzes}}},
+            {
+                "$project": {
+                    "_id": "$session_id",
+                    "average_score": {"$divide": ["$total_score", "$total_quizzes"]},
+                    "total_quizzes": 1,
+                    "best_score": 1,
+                    "last_activity": 1
+                }
+            },
+            {"$sort": {"average_score": DESCENDING, "_id": ASCENDING}},
+            {"$limit": limit}
+        ]
+        return await self.db.user_progress.aggregate(pipeline).to_list(length=limit)
+
+class MemoryStorage(Storage):
+    """Everything in dicts; nothing survives a restart"""
+
+    name = "memory"
+
+    def __init__(self, session_ttl_seconds: int = 86400):
+        super().__init__(session_ttl_seconds)
+        self._questions: Dict[str, Dict[str, Any]] = {}
+        self._question_ids_by_hash: Dict[str, str] = {}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._attempts: List[Dict[str, Any]] = []
+        self._question_stats: Dict[str, Dict[str, Any]] = {}
+        self._progress: Dict[str, Dict[str, Any]] = {}
+
+    def _matching(self, difficulty_level, topic):
+        return [
+            q for q in self._questions.values()
+            if (not difficulty_level or q["difficulty_level"] == difficulty_level) and (not topic or q["topic"] == topic)
+        ]
+
+    async def count_questions(self, difficulty_level=None, topic=None):
+        return len(self._matching(difficulty_level, topic))
+
+    async def sample_questions(self, difficulty_level, topic, count):
+        pool = self._matching(difficulty_level, topic)
+        return copy.deepcopy(random.sample(pool, min(count, len(pool))))
+
+    async def get_questions(self, ids):
+        return [copy.deepcopy(self._questions[qid]) for qid in ids if qid in self._questions]
+
+    async def get_questions_by_hash(self, content_hashes):
+        return await self.get_questions(
+            [self._question_ids_by_hash[h] for h in content_hashes if h in self._question_ids_by_hash]
+        )
+
+    async def iter_questions(self, difficulty_level=None, topic=None, after=None, fields=None, limit=None,
+                             batch_size=500):
+        docs = sorted(self._matching(difficulty_level, topic), key=lambda q: (q["created_at"], q["id"]))
+        if after is not None:
+            after = to_stored(after)
+            docs = [q for q in docs if (q["created_at"], q["id"]) > tuple(after)]
+        for doc in docs[:limit]:
+            yield copy.deepcopy(project(doc, fields, exclude=("content_hash",)))
+
+    async def upsert_questions(self, questions):
+        counts = [0, 0, 0]
+        for question in questions:
+            update = question_upsert(question)
+            existing_id = self._question_ids_by_hash.get(question["content_hash"])
+            if existing_id is None:
+                doc = apply_update({"content_hash": question["content_hash"]}, update, inserted=True)
+                self._questions[doc["id"]] = doc
+                self._question_ids_by_hash[doc["content_hash"]] = doc["id"]
+                counts[0] += 1
+                continue
+            doc = self._questions[existing_id]
+            updated = apply_update(copy.deepcopy(doc), update)
+            if updated != doc:
+                self._questions[existing_id] = updated
+                counts[1] += 1
+            else:
+                counts[2] += 1
+        return tuple(counts)
+
+    async def save_quiz_session(self, session):
+        self._sessions[session["id"]] = to_stored(session)
+        cutoff = self._session_cutoff()
+        while self._sessions and next(iter(self._sessions.values()))["created_at"] < cutoff:
+            self._sessions.popitem(last=False)
+
+    async def get_quiz_session(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        if session is None or session["created_at"] < self._session_cutoff():
+            return None
+        return copy.deepcopy(session)
+
+    async def mark_quiz_submitted(self, quiz_id):
+        session = self._sessions.get(quiz_id)
+        if session is None or session["created_at"] < self._session_cutoff() or "submitted_at" in session:
+            return False
+        session["submitted_at"] = to_stored(datetime.now(timezone.utc))
+        return True
+
+    async def insert_attempts(self, attempts):
+        self._attempts.extend(to_stored(attempts))
+
+    async def record_answers(self, questions, answers, correct):
+        for question, answer, is_correct in zip(to_stored(questions), answers, correct):
+            stats = self._question_stats.get(question["id"])
+            inserted = stats is None
+            if inserted:
+                stats = self._question_stats[question["id"]] = {"question_id": question["id"]}
+            apply_update(stats, question_stats_update(question, answer, is_correct), inserted=inserted)
+
+    async def question_stats(self, topic=None, difficulty_level=None, min_served=0, sort_by="accuracy",
+                             descending=False, limit=50):
+        docs = [
+            with_accuracy(s) for s in self._question_stats.values()
+            if (not topic or s["topic"] == topic) and (not difficulty_level or s["difficulty_level"] == difficulty_level)
+            and s["served"] >= min_served
+        ]
+        docs.sort(key=lambda s: s["question_id"])
+        docs.sort(key=lambda s: s[sort_by], reverse=descending)
+        return copy.deepcopy(docs[:limit])
+
+    async def record_progress(self, attempt, question_topics, correct):
+        attempt = to_stored(attempt)
+        progress = self._progress.get(attempt["session_id"])
+        inserted = progress is None
+        if inserted:
+            progress = self._progress[attempt["session_id"]] = {"session_id": attempt["session_id"]}
+        apply_update(progress, progress_update(attempt, question_topics, correct), inserted=inserted)
+        return project(progress, list(PROGRESS_SUMMARY_FIELDS))
+
+    async def get_progress(self, session_id, exclude=()):
+        progress = self._progress.get(session_id)
+        return copy.deepcopy(project(progress, exclude=exclude)) if progress else None
+
+    async def top_sessions(self, min_quizzes, limit):
+        entries = [leaderboard_entry(p) for p in self._progress.values() if p["total_quizzes"] >= min_quizzes]
+        entries.sort(key=lambda e: (-e["average_score"], e["_id"]))
+        return entries[:limit]
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="milliseconds")}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+def _dumps(doc: Dict[str, Any]) -> bytes:
+    return orjson.dumps(_encode(doc))
+
+def _loads(raw: bytes) -> Dict[str, Any]:
+    return _decode(orjson.loads(raw))
+
+def _sql_time(value: datetime) -> str:
+    return to_stored(value).isoformat(timespec="milliseconds")
+
+class SQLiteStorage(Storage):
+    """One SQLite file; documents are stored as JSON next to the columns they are queried by.
+
+    All statements run on a single worker thread, which serialises writes the
+    way a single mongod document lock would for the read-modify-write updates.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS questions (
+            id TEXT PRIMARY KEY, content_hash TEXT UNIQUE, difficulty_level TEXT, topic TEXT,
+            created_at TEXT, doc BLOB)""",
+        "CREATE INDEX IF NOT EXISTS questions_difficulty_topic_created_at_id"
+        " ON questions (difficulty_level, topic, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS questions_created_at_id ON questions (created_at, id)",
+        "CREATE TABLE IF NOT EXISTS quiz_sessions (id TEXT PRIMARY KEY, created_at TEXT, doc BLOB)",
+        "CREATE INDEX IF NOT EXISTS quiz_sessions_created_at ON quiz_sessions (created_at)",
+        """CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id TEXT PRIMARY KEY, session_id TEXT, completed_at TEXT, doc BLOB)""",
+        "CREATE INDEX IF NOT EXISTS quiz_attempts_session_recent ON quiz_attempts (session_id, completed_at DESC)",
+        """CREATE TABLE IF NOT EXISTS question_stats (
+            question_id TEXT PRIMARY KEY, topic TEXT, difficulty_level TEXT,
+            served INTEGER, correct INTEGER, skipped INTEGER, doc BLOB)""",
+        "CREATE INDEX IF NOT EXISTS question_stats_topic_difficulty ON question_stats (topic, difficulty_level)",
+        """CREATE TABLE IF NOT EXISTS user_progress (
+            session_id TEXT PRIMARY KEY, total_quizzes INTEGER, total_score REAL, doc BLOB)""",
+        "CREATE INDEX IF NOT EXISTS user_progress_total_quizzes ON user_progress (total_quizzes)",
+    ]
+    # Expired quiz sessions are purged once every this many saves
+    SESSION_PURGE_EVERY = 1000
+
+    def __init__(self, path: str, session_ttl_seconds: int = 86400):
+        super().__init__(session_ttl_seconds)
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._saves = 0
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._conn is None:
+            await self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    async def start(self):
+        if self._conn is None:
+            self._conn = await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+
+    async def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.get_running_loop().run_in_executor(self._executor, conn.close)
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Callable[[], Any]:
+        def run():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+        return run
+
+    @staticmethod
+    def _where(difficulty_level=None, topic=None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in (("difficulty_level", difficulty_level), ("topic", topic)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    async def count_questions(self, difficulty_level=None, topic=None):
+        where, params = self._where(difficulty_level, topic)
+        rows = await self._run(self._query, f"SELECT COUNT(*) FROM questions{where}", tuple(params))
+        return rows[0][0]
+
+    async def sample_questions(self, difficulty_level, topic, count):
+        where, params = self._where(difficulty_level, topic)
+        rows = await self._run(
+            self._query, f"SELECT doc FROM questions{where} ORDER BY random() LIMIT ?", (*params, count)
+        )
+        return [_loads(doc) for doc, in rows]
+
+    async def get_questions(self, ids):
+        return await self._questions_where("id", ids)
+
+    async def get_questions_by_hash(self, content_hashes):
+        return await self._questions_where("content_hash", content_hashes)
+
+    async def _questions_where(self, column: str, values: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        # Stay under SQLITE_MAX_VARIABLE_NUMBER on old builds
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            rows += await self._run(
+                self._query, f"SELECT doc FROM questions WHERE {column} IN ({','.join('?' * len(chunk))})",
+                tuple(chunk)
+            )
+        return [_loads(doc) for doc, in rows]
+
+    async def iter_questions(self, difficulty_level=None, topic=None, after=None, fields=None, limit=None,
+                             batch_size=500):
+        where, params = self._where(difficulty_level, topic)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_where, page_params = where, list(params)
+            if after is not None:
+                page_where += (" AND " if page_where else " WHERE ") + "(created_at, id) > (?, ?)"
+                page_params += [_sql_time(after[0]), after[1]]
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            rows = await self._run(
+                self._query,
+                f"SELECT doc FROM questions{page_where} ORDER BY created_at, id LIMIT ?", (*page_params, size)
+            )
+            for raw, in rows:
+                doc = _loads(raw)
+                yield project(doc, fields, exclude=("content_hash",))
+            if len(rows) < size:
+                return
+            after = (doc["created_at"], doc["id"])
+            if remaining is not None:
+                remaining -= len(rows)
+
+    async def upsert_questions(self, questions):
+        def upsert(conn):
+            counts = [0, 0, 0]
+            for question in questions:
+                update = question_upsert(question)
+                row = conn.execute("SELECT doc FROM questions WHERE content_hash = ?",
+                                   (question["content_hash"],)).fetchone()
+                if row is None:
+                    doc = apply_update({"content_hash": question["content_hash"]}, update, inserted=True)
+                    counts[0] += 1
+                else:
+                    current = _loads(row[0])
+                    doc = apply_update(copy.deepcopy(current), update)
+                    if doc == current:
+                        counts[2] += 1
+                        continue
+                    counts[1] += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO questions (id, content_hash, difficulty_level, topic, created_at, doc)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc["id"], doc["content_hash"], doc["difficulty_level"], doc["topic"],
+                     _sql_time(doc["created_at"]), _dumps(doc))
+                )
+            return tuple(counts)
+        return await self._run(self._transaction(upsert))
+
+    async def save_quiz_session(self, session):
+        session = to_stored(session)
+        self._saves += 1
+        purge = self._saves % self.SESSION_PURGE_EVERY == 0
+        cutoff = _sql_time(self._session_cutoff())
+
+        def save(conn):
+            conn.execute("INSERT INTO quiz_sessions (id, created_at, doc) VALUES (?, ?, ?)",
+                         (session["id"], _sql_time(session["created_at"]), _dumps(session)))
+            if purge:
+                conn.execute("DELETE FROM quiz_sessions WHERE created_at < ?", (cutoff,))
+        await self._run(self._transaction(save))
+
+    async def get_quiz_session(self, quiz_id):
+        rows = await self._run(
+            self._query, "SELECT doc FROM quiz_sessions WHERE id = ? AND created_at >= ?",
+            (quiz_id, _sql_time(self._session_cutoff()))
+        )
+        return _loads(rows[0][0]) if rows else None
+
+    async def mark_quiz_submitted(self, quiz_id):
+        now = datetime.now(timezone.utc)
+        cutoff = _sql_time(self._session_cutoff())
+
+        def mark(conn):
+            row = conn.execute("SELECT doc FROM quiz_sessions WHERE id = ? AND created_at >= ?",
+                               (quiz_id, cutoff)).fetchone()
+            session = _loads(row[0]) if row else None
+            if session is None or "submitted_at" in session:
+                return False
+            session["submitted_at"] = to_stored(now)
+            conn.execute("UPDATE quiz_sessions SET doc = ? WHERE id = ?", (_dumps(session), quiz_id))
+            return True
+        return await self._run(self._transaction(mark))
+
+    async def insert_attempts(self, attempts):
+        rows = [
+            (a["id"], a["session_id"], _sql_time(a["completed_at"]), _dumps(a)) for a in to_stored(attempts)
+        ]
+
+        def insert(conn):
+            conn.executemany("INSERT INTO quiz_attempts (id, session_id, completed_at, doc) VALUES (?, ?, ?, ?)", rows)
+        await self._run(self._transaction(insert))
+
+    async def record_answers(self, questions, answers, correct):
+        def record(conn):
+            for question, answer, is_correct in zip(to_stored(questions), answers, correct):
+                row = conn.execute("SELECT doc FROM question_stats WHERE question_id = ?", (question["id"],)).fetchone()
+                stats = _loads(row[0]) if row else {"question_id": question["id"]}
+                apply_update(stats, question_stats_update(question, answer, is_correct), inserted=row is None)
+                conn.execute(
+                    "INSERT OR REPLACE INTO question_stats"
+                    " (question_id, topic, difficulty_level, served, correct, skipped, doc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (stats["question_id"], stats["topic"], stats["difficulty_level"], stats["served"],
+                     stats["correct"], stats["skipped"], _dumps(stats))
+                )
+        await self._run(self._transaction(record))
+
+    async def question_stats(self, topic=None, difficulty_level=None, min_served=0, sort_by="accuracy",
+                             descending=False, limit=50):
+        if sort_by not in QUESTION_STATS_SORT_FIELDS:
+            raise ValueError(f"Cannot sort question stats by {sort_by}")
+        where, params = self._where(difficulty_level, topic)
+        where += (" AND " if where else " WHERE ") + "served >= ?"
+        order = "CAST(correct AS REAL) / served" if sort_by == "accuracy" else sort_by
+        rows = await self._run(
+            self._query,
+            f"SELECT doc FROM question_stats{where}"
+            f" ORDER BY {order} {'DESC' if descending else 'ASC'}, question_id LIMIT ?",
+            (*params, min_served, limit)
+        )
+        return [with_accuracy(_loads(doc)) for doc, in rows]
+
+    async def record_progress(self, attempt, question_topics, correct):
+        attempt = to_stored(attempt)
+        update = progress_update(attempt, question_topics, correct)
+
+        def record(conn):
+            row = conn.execute("SELECT doc FROM user_progress WHERE session_id = ?", (attempt["session_id"],)).fetchone()
+            progress = _loads(row[0]) if row else {"session_id": attempt["session_id"]}
+            apply_update(progress, update, inserted=row is None)
+            conn.execute(
+                "INSERT OR REPLACE INTO user_progress (session_id, total_quizzes, total_score, doc) VALUES (?, ?, ?, ?)",
+                (progress["session_id"], progress["total_quizzes"], progress["total_score"], _dumps(progress))
+            )
+            return project(progress, list(PROGRESS_SUMMARY_FIELDS))
+        return await self._run(self._transaction(record))
+
+    async def get_progress(self, session_id, exclude=()):
+        rows = await self._run(self._query, "SELECT doc FROM user_progress WHERE session_id = ?", (session_id,))
+        return project(_loads(rows[0][0]), exclude=exclude) if rows else None
+
+    async def top_sessions(self, min_quizzes, limit):
+        rows = await self._run(
+            self._query,
+            "SELECT doc FROM user_progress WHERE total_quizzes >= ?"
+            " ORDER BY total_score / total_quizzes DESC, session_id LIMIT ?",
+            (min_quizzes, limit)
+        )
+        return [leaderboard_entry(_loads(doc)) for doc, in rows]
+
+def open_storage(backend: str, db=None, sqlite_path: str = "netst.sqlite3", session_ttl_seconds: int = 86400) -> Storage:
+    if backend == "mongo":
+        return MotorStorage(db, session_ttl_seconds=session_ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path, session_ttl_seconds=session_ttl_seconds)
+    if backend == "memory":
+        return MemoryStorage(session_ttl_seconds=session_ttl_seconds)
+    raise ValueError(f"Unknown storage backend {backend!r}, expected mongo, sqlite or memory")
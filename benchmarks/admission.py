@@ -0,0 +1,118 @@
+"""quiz/submit latency while an expensive endpoint is flooded, with and without admission control.
+
+Runs the app in-process against a scratch database on a local mongod. A set of
+quiz takers loops over quiz/start + quiz/submit while flooders hammer an
+expensive route (GET /api/questions/stats by default) as fast as they can.
+The run is repeated with admission control disabled and with the limits from
+--concurrency-limits / --rate-limits (the server defaults unless given), and
+latency per endpoint is reported for both.
+
+    python benchmarks/admission.py --flooders 200 --takers 20 --duration 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from load import Recorder, scratch_admin_headers, synthetic_bank  # noqa: E402
+
+
+async def taker(client, recorder, deadline, question_count):
+    session_id = f"taker_{uuid.uuid4().hex[:12]}"
+    headers = {"X-Session-Id": session_id}
+    while time.monotonic() < deadline:
+        response = await recorder.call("quiz/start", client.post(
+            "/api/quiz/start", json={"difficulty_level": "beginner", "question_count": question_count}, headers=headers
+        ))
+        if response is None or response.status_code != 200:
+            await asyncio.sleep(0.05)
+            continue
+        quiz = response.json()
+        answers = [random.randrange(len(q["options"])) for q in quiz["questions"]]
+        await recorder.call("quiz/submit", client.post("/api/quiz/submit", json={
+            "session_id": session_id, "quiz_id": quiz["id"], "answers": answers, "time_taken": 60
+        }, headers=headers))
+
+
+async def flooder(client, recorder, deadline, path):
+    headers = {"X-Session-Id": f"flood_{uuid.uuid4().hex[:12]}"}
+    while time.monotonic() < deadline:
+        response = await recorder.call("flood", client.get(path, headers=headers))
+        if response is not None and response.status_code in (429, 503):
+            # Well-behaved clients back off; this one only yields so the loop stays busy
+            await asyncio.sleep(0)
+
+
+async def phase(client, args):
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(
+        *[flooder(client, recorder, deadline, args.flood_path) for _ in range(args.flooders)],
+        *[taker(client, recorder, deadline, args.question_count) for _ in range(args.takers)],
+    )
+    return recorder.report(time.monotonic() - started)
+
+
+async def run(args):
+    scratch_db = f"netst_admission_{uuid.uuid4().hex[:8]}"
+    os.environ["DB_NAME"] = scratch_db
+    admin_headers = scratch_admin_headers()
+    import server
+
+    await server.app.router.startup()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench",
+                               timeout=args.timeout)
+    reports = {}
+    try:
+        body = "\n".join(synthetic_bank(args.bank_size))
+        (await client.post("/api/questions/import", content=body, headers=admin_headers,
+                           timeout=None)).raise_for_status()
+        concurrency = args.concurrency_limits if args.concurrency_limits is not None else server.DEFAULT_ADMISSION_CONCURRENCY
+        rate_limits = args.rate_limits if args.rate_limits is not None else server.DEFAULT_ADMISSION_RATE_LIMITS
+        for name, limits in (("off", ("", "")), ("on", (concurrency, rate_limits))):
+            server.admission.configure(*limits, queue_timeout=args.queue_timeout)
+            reports[name] = await phase(client, args)
+    finally:
+        await client.aclose()
+        await server.client.drop_database(scratch_db)
+        await server.app.router.shutdown()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--takers", type=int, default=20, help="concurrent quiz takers")
+    parser.add_argument("--flooders", type=int, default=200, help="concurrent clients flooding --flood-path")
+    parser.add_argument("--flood-path", default="/api/questions/stats?limit=1000")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per phase")
+    parser.add_argument("--bank-size", type=int, default=5000)
+    parser.add_argument("--question-count", type=int, default=10)
+    parser.add_argument("--concurrency-limits", help="ADMISSION_CONCURRENCY for the 'on' phase")
+    parser.add_argument("--rate-limits", help="ADMISSION_RATE_LIMITS for the 'on' phase")
+    parser.add_argument("--queue-timeout", type=float, default=2.0, help="seconds a request may wait for a slot")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write both reports as JSON to this path")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run(args))
+    print(f"{'admission':<11}{'endpoint':<13}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for name, report in reports.items():
+        for endpoint, stats in report["endpoints"].items():
+            print(f"{name:<11}{endpoint:<13}{stats['requests']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                  f"{stats['p99_ms']:>10}  {stats['statuses']}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Load test for the quiz API against a local mongod.
+
+Drives a weighted mix of quiz/start, quiz/submit, progress and leaderboard
+requests from concurrent virtual users and reports p50/p95/p99 latency and
+requests per second for each endpoint.
+
+The app runs either in-process (ASGI transport, same event loop) or under
+uvicorn in a subprocess; --base-url targets a server that is already running.
+Unless --base-url is given, a scratch database is created and dropped.
+--storage picks the backend (mongo, sqlite or memory) so they can be compared.
+
+    python benchmarks/load.py --concurrency 50 --duration 30 --output run.json
+    python benchmarks/load.py --server uvicorn --workers 4 --baseline run.json
+    python benchmarks/load.py --storage sqlite --output sqlite.json --baseline run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+ENDPOINTS = ("quiz/start", "quiz/submit", "progress", "leaderboard")
+DEFAULT_MIX = "quiz/start=4,quiz/submit=4,progress=1,leaderboard=1"
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}, expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def scratch_admin_headers():
+    """Enable the admin routes of the server this run starts; call before importing server"""
+    token = os.environ.setdefault("ADMIN_TOKEN", uuid.uuid4().hex)
+    return {"X-Admin-Token": token}
+
+
+def synthetic_bank(size):
+    topics = ["osi_model", "subnetting", "routing_protocols", "switching", "ip_addressing"]
+    levels = ["beginner", "intermediate", "advanced"]
+    for i in range(size):
+        yield json.dumps({
+            "question_text": f"Load test question {i}",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": i % 4,
+            "explanation": "Synthetic",
+            "topic": topics[i % len(topics)],
+            "difficulty_level": levels[i % len(levels)],
+        })
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, endpoint, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        self.statuses[endpoint][str(status)] += 1
+        return response
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples.sort()
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(samples, 50), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "p99_ms": round(percentile(samples, 99), 3),
+                "statuses": dict(self.statuses[endpoint]),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {"elapsed_seconds": round(elapsed, 3), "requests": total, "rps": round(total / elapsed, 1), "endpoints": endpoints}
+
+
+async def back_off(response, deadline):
+    """Wait out a 429 or 503 as a well-behaved client would, but not past the deadline
+
+    Over the in-process transport a request that never waits on I/O (a shed
+    one, or any on the memory backend) does not yield to the event loop, so
+    every request is followed by at least a yield to keep users taking turns.
+    """
+    if response is None or response.status_code not in (429, 503):
+        await asyncio.sleep(0)
+        return
+    try:
+        delay = float(response.headers.get("retry-after", 1))
+    except ValueError:
+        delay = 1.0
+    await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+
+async def virtual_user(client, recorder, mix, deadline, question_count, difficulty):
+    session_id = f"load_{uuid.uuid4().hex[:12]}"
+    # Sent by the frontend too; per-session rate limits key on it
+    headers = {"X-Session-Id": session_id}
+    quiz = None
+    names, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        endpoint = random.choices(names, weights)[0]
+        if endpoint == "quiz/submit" and quiz is None:
+            endpoint = "quiz/start"
+
+        if endpoint == "quiz/start":
+            response = await recorder.call(endpoint, client.post(
+                "/api/quiz/start", json={"difficulty_level": difficulty, "question_count": question_count},
+                headers=headers
+            ))
+            if response is not None and response.status_code == 200:
+                quiz = response.json()
+        elif endpoint == "quiz/submit":
+            answers = [random.randrange(len(q["options"])) for q in quiz["questions"]]
+            response = await recorder.call(endpoint, client.post("/api/quiz/submit", json={
+                "session_id": session_id, "quiz_id": quiz["id"], "answers": answers, "time_taken": 60
+            }, headers=headers))
+            if response is None or response.status_code not in (429, 503):
+                quiz = None
+        elif endpoint == "progress":
+            response = await recorder.call(endpoint, client.get(f"/api/progress/{session_id}", headers=headers))
+        else:
+            response = await recorder.call(endpoint, client.get("/api/leaderboard", headers=headers))
+        await back_off(response, deadline)
+
+
+async def wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+async def run(args):
+    scratch_db = None
+    scratch_dir = tempfile.TemporaryDirectory()
+    if not args.base_url:
+        scratch_db = f"netst_load_{uuid.uuid4().hex[:8]}"
+        os.environ["DB_NAME"] = scratch_db
+        os.environ["STORAGE_BACKEND"] = args.storage
+        os.environ["SQLITE_PATH"] = str(Path(scratch_dir.name) / "load.sqlite3")
+    admin_headers = scratch_admin_headers()
+    import server
+
+    process = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    elif args.server == "uvicorn":
+        port = args.port
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=os.environ.copy()
+        )
+        await wait_until_ready(f"http://127.0.0.1:{port}")
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        await server.app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest",
+                                   timeout=args.timeout)
+
+    try:
+        if scratch_db:
+            body = "\n".join(synthetic_bank(args.bank_size))
+            response = await client.post("/api/questions/import", content=body, headers=admin_headers, timeout=None)
+            response.raise_for_status()
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            virtual_user(client, recorder, args.mix, deadline, args.question_count, args.difficulty)
+            for _ in range(args.concurrency)
+        ])
+        report = recorder.report(time.monotonic() - started)
+    finally:
+        await client.aclose()
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if scratch_db and args.storage == "mongo":
+            await server.client.drop_database(scratch_db)
+        if not args.base_url and args.server == "inprocess":
+            await server.app.router.shutdown()
+        scratch_dir.cleanup()
+
+    report["config"] = {
+        "server": "external" if args.base_url else args.server,
+        "storage": None if args.base_url else args.storage,
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": args.mix,
+        "bank_size": args.bank_size,
+        "question_count": args.question_count,
+    }
+    return report
+
+
+def compare(report, baseline, max_regression):
+    """Return the endpoints whose p95 grew by more than max_regression relative to the baseline"""
+    regressions = []
+    for endpoint, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if previous and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{endpoint}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--base-url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--storage", choices=["mongo", "sqlite", "memory"], default="mongo",
+                        help="storage backend for the scratch server (memory needs --workers 1)")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--bank-size", type=int, default=1000)
+    parser.add_argument("--question-count", type=int, default=10)
+    parser.add_argument("--difficulty", default="beginner")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    parser.add_argument("--baseline", help="previous JSON report to compare p95 latency against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 growth vs. baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    report = asyncio.run(run(args))
+    print(f"{'endpoint':<14}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<14}{stats['requests']:>10}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"{'total':<14}{report['requests']:>10}{report['rps']:>10}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if baseline:
+        regressions = compare(report, baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
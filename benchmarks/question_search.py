@@ -0,0 +1,100 @@
+"""Build time and query latency of the in-process question search index.
+
+Generates a synthetic bank from CCNA-style templates (so term frequencies
+are skewed like a real bank, with a few very common words and many rare
+addresses), indexes it and times each query in --queries, with and without
+topic and difficulty filters. No database is needed.
+
+    python benchmarks/question_search.py --size 100000 --output search.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from load import percentile  # noqa: E402
+from search import QuestionSearchIndex  # noqa: E402
+
+TOPICS = ["osi_model", "subnetting", "routing_protocols", "switching", "ip_addressing"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+TEMPLATES = [
+    ("How many usable hosts does {net}/{prefix} provide?", "subnetting"),
+    ("Which OSPF area type would {router} use to reach {net}/{prefix}?", "routing_protocols"),
+    ("What is the broadcast address of {net}/{prefix}?", "subnetting"),
+    ("Which OSI layer handles {thing} on {router}?", "osi_model"),
+    ("Why does VLAN {vlan} not pass the 802.1Q trunk on {router}?", "switching"),
+    ("Which EIGRP metric does {router} prefer for {net}?", "routing_protocols"),
+    ("Is {net} a private IPv4 address?", "ip_addressing"),
+    ("What does STP do when {router} sees a BPDU on VLAN {vlan}?", "switching"),
+]
+THINGS = ["routing", "framing", "encryption", "session setup", "segmentation", "MAC addressing"]
+DEFAULT_QUERIES = ["OSPF", "/26", "broadcast address", "vlan trunk", "10.1.2.0", "layer", "which", "bgp"]
+
+
+def synthetic_bank(size, seed=1):
+    rng = random.Random(seed)
+    for i in range(size):
+        template, topic = rng.choice(TEMPLATES)
+        fields = {
+            "net": f"10.{rng.randrange(256)}.{rng.randrange(256)}.0",
+            "prefix": rng.randrange(8, 31),
+            "router": f"R{rng.randrange(1, 500)}",
+            "vlan": rng.randrange(1, 4095),
+            "thing": rng.choice(THINGS),
+        }
+        yield {
+            "id": str(uuid.uuid4()),
+            "question_text": template.format(**fields),
+            "options": [f"Option {c} for question {i}" for c in "ABCD"],
+            "explanation": f"See the {topic.replace('_', ' ')} chapter; {template.format(**fields).lower()}",
+            "topic": topic,
+            "difficulty_level": LEVELS[i % len(LEVELS)],
+        }
+
+
+def time_query(index, query, filters, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total, _ = index.search(query, **filters)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {"matches": total, "p50_us": round(percentile(samples, 50), 1),
+            "p95_us": round(percentile(samples, 95), 1), "max_us": round(samples[-1], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="questions in the bank")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs per query")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    bank = list(synthetic_bank(args.size))
+    start = time.perf_counter()
+    index = QuestionSearchIndex(capacity=args.size)
+    index.add(bank)
+    build_seconds = time.perf_counter() - start
+    print(f"indexed {len(index)} questions in {build_seconds:.2f} s: {index.stats()}")
+
+    results = {"size": args.size, "build_seconds": round(build_seconds, 3), "queries": []}
+    print(f"{'query':<20}{'filters':<24}{'matches':>9}{'p50 us':>10}{'p95 us':>10}{'max us':>10}")
+    for query in args.queries:
+        for filters in ({}, {"topic": "subnetting", "difficulty_level": "beginner"}):
+            row = {"query": query, "filters": filters, **time_query(index, query, filters, args.repeat)}
+            results["queries"].append(row)
+            label = ",".join(filters.values()) or "-"
+            print(f"{query:<20}{label:<24}{row['matches']:>9}{row['p50_us']:>10}{row['p95_us']:>10}{row['max_us']:>10}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Quiz question selection latency vs. question bank size.
+
+Compares the legacy full fetch + ``random.sample`` against the Mongo-side
+``$match`` + ``$sample`` engine in ``server.sample_questions``.
+
+Needs a local mongod (MONGO_URL, default mongodb://localhost:27017). The bank
+is written to a scratch database that is dropped afterwards:
+
+    python benchmarks/quiz_sampling.py --sizes 10 100 1000 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+from server import DifficultyLevel, Question, Topic  # noqa: E402
+from storage import MotorStorage  # noqa: E402
+
+
+def make_question(i):
+    return Question(
+        question_text=f"Synthetic question {i} {uuid.uuid4()}",
+        options=["A", "B", "C", "D"],
+        correct_answer=random.randrange(4),
+        explanation="Synthetic explanation",
+        topic=random.choice(list(Topic)),
+        difficulty_level=random.choice(list(DifficultyLevel)),
+    ).dict()
+
+
+async def legacy_select(difficulty_level, count):
+    questions = await server.db.questions.find({"difficulty_level": difficulty_level.value}).to_list(length=None)
+    return [Question(**q) for q in random.sample(questions, count)]
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+async def run(sizes, count, repeat):
+    db, storage = server.db, server.storage
+    # Both paths must read the scratch bank; sample_questions goes through server.storage
+    server.db = server.client[f"netst_bench_{uuid.uuid4().hex[:8]}"]
+    server.storage = MotorStorage(server.db)
+    await server.db.questions.create_index([("difficulty_level", 1), ("topic", 1)])
+    results = []
+    loaded = 0
+    try:
+        for size in sorted(sizes):
+            while loaded < size:
+                batch = [make_question(i) for i in range(loaded, min(size, loaded + 5000))]
+                await server.db.questions.insert_many(batch)
+                loaded += len(batch)
+
+            level = DifficultyLevel.BEGINNER
+            row = {
+                "bank_size": size,
+                "legacy": await timed(lambda: legacy_select(level, min(count, size // 4)), repeat),
+                "sample": await timed(lambda: server.sample_questions(level, None, min(count, size // 4)), repeat),
+            }
+            results.append(row)
+            print(
+                f"{size:>8}  legacy p50 {row['legacy']['p50_ms']:>9.3f} ms   "
+                f"$sample p50 {row['sample']['p50_ms']:>7.3f} ms"
+            )
+    finally:
+        await server.client.drop_database(server.db.name)
+        server.db, server.storage = db, storage
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--count", type=int, default=10, help="questions per quiz")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.sizes, args.count, args.repeat))
+    if args.output:
+        Path(args.output).write_text(json.dumps({"mongo_url": os.environ.get("MONGO_URL"), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""CPU cost of encoding question responses, before and after the orjson fast path.
+
+"legacy" is what GET /api/questions and POST /api/quiz/start used to do: build
+a Question per stored document, validate it again against the response model,
+run it through jsonable_encoder and encode it with the stdlib json module.
+"fast" encodes the projected Mongo documents (or the cached Question dicts)
+directly with ORJSONResponse. No database is needed.
+
+    python benchmarks/serialization.py --sizes 10 1000 10000
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import Question  # noqa: E402
+
+RESPONSE_MODEL = TypeAdapter(List[Question])
+
+
+def stored_documents(count):
+    # Motor returns naive UTC datetimes and plain strings for enum fields
+    return [{
+        "id": str(uuid.uuid4()),
+        "question_text": f"Which OSI layer is responsible for routing packets? ({i})",
+        "options": ["Layer 2", "Layer 3", "Layer 4", "Layer 5"],
+        "correct_answer": 1,
+        "explanation": "Layer 3 (Network layer) is responsible for routing packets between different networks.",
+        "topic": "osi_model",
+        "difficulty_level": "beginner",
+        "created_at": datetime.utcnow(),
+    } for i in range(count)]
+
+
+def legacy(docs):
+    questions = [Question(**doc) for doc in docs]
+    validated = RESPONSE_MODEL.validate_python(questions)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def fast(docs):
+    return ORJSONResponse(docs).body
+
+
+def cpu_per_call(fn, docs, min_seconds=0.5):
+    calls = 0
+    start = time.process_time()
+    while True:
+        fn(docs)
+        calls += 1
+        elapsed = time.process_time() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'documents':>10}{'legacy ms':>12}{'fast ms':>12}{'speedup':>10}")
+    for size in args.sizes:
+        docs = stored_documents(size)
+        assert json.loads(legacy(docs)) == json.loads(fast(docs))
+        row = {"documents": size, "legacy_ms": cpu_per_call(legacy, docs), "fast_ms": cpu_per_call(fast, docs)}
+        row["speedup"] = row["legacy_ms"] / row["fast_ms"]
+        results.append(row)
+        print(f"{size:>10}{row['legacy_ms']:>12.3f}{row['fast_ms']:>12.3f}{row['speedup']:>9.1f}x")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
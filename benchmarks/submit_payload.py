@@ -0,0 +1,110 @@
+"""quiz/submit response size and latency, full vs compact results.
+
+Runs the app in-process on the memory storage backend, so no mongod is
+needed. For each quiz size quizzes are started and submitted, each once,
+in the full format (question text, options and explanation per question) and
+the compact one (ids, answers, answer key and a correctness bitmap). Sizes
+are reported uncompressed and with each content coding the server negotiates,
+latencies are measured with compression on since that is what clients see.
+The synthetic bank repeats the same text in every question, so full results
+compress far better here than they would for a real bank; compare the
+identity sizes for the payload saving.
+
+    python benchmarks/submit_payload.py --sizes 10 50 200 1000 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from load import percentile, scratch_admin_headers, synthetic_bank  # noqa: E402
+
+FORMATS = ("full", "compact")
+ENCODINGS = ("identity", "gzip", "br")
+
+
+async def submit(client, quiz, session_id, format, encoding):
+    answers = [random.randrange(len(q["options"])) for q in quiz["questions"]]
+    response = await client.post(f"/api/quiz/submit?format={format}", json={
+        "session_id": session_id, "quiz_id": quiz["id"], "answers": answers, "time_taken": 60
+    }, headers={"Accept-Encoding": encoding, "X-Session-Id": session_id})
+    response.raise_for_status()
+    return response
+
+
+async def start(client, size, session_id):
+    response = await client.post("/api/quiz/start", json={"difficulty_level": "beginner", "question_count": size},
+                                 headers={"X-Session-Id": session_id})
+    response.raise_for_status()
+    return response.json()
+
+
+async def measure(client, size, args):
+    session_id = f"payload_{uuid.uuid4().hex[:12]}"
+    row = {"questions": size}
+    for format in FORMATS:
+        # A quiz can only be submitted once, so every submission gets a fresh one
+        for encoding in ENCODINGS:
+            response = await submit(client, await start(client, size, session_id), session_id, format, encoding)
+            # The wire size; httpx has already decoded response.content
+            coding = response.headers.get("content-encoding", "identity")
+            row[f"{format}_{encoding}_bytes"] = int(response.headers["content-length"]) if coding == encoding else None
+        latencies = []
+        for _ in range(args.repeat):
+            quiz = await start(client, size, session_id)
+            started = time.perf_counter()
+            await submit(client, quiz, session_id, format, "gzip, br")
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        row[f"{format}_p50_ms"] = round(percentile(latencies, 50), 3)
+        row[f"{format}_p95_ms"] = round(percentile(latencies, 95), 3)
+    return row
+
+
+async def run(args):
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["ADMISSION_CONCURRENCY"] = ""
+    os.environ["ADMISSION_RATE_LIMITS"] = ""
+    admin_headers = scratch_admin_headers()
+    import server
+
+    await server.app.router.startup()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=None)
+    try:
+        # Each quiz draws from one difficulty level, so the bank needs three times the largest size
+        body = "\n".join(synthetic_bank(max(args.sizes) * 3))
+        (await client.post("/api/questions/import", content=body, headers=admin_headers)).raise_for_status()
+        return [await measure(client, size, args) for size in args.sizes]
+    finally:
+        await client.aclose()
+        await server.app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000], help="questions per quiz")
+    parser.add_argument("--repeat", type=int, default=200, help="submissions timed per size and format")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'questions':>10}{'format':>9}" + "".join(f"{e + ' B':>12}" for e in ENCODINGS) + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for row in results:
+        for format in FORMATS:
+            sizes = "".join(f"{str(row[f'{format}_{e}_bytes'] or '-'):>12}" for e in ENCODINGS)
+            print(f"{row['questions']:>10}{format:>9}{sizes}{row[f'{format}_p50_ms']:>10}{row[f'{format}_p95_ms']:>10}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
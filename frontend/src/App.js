@@ -35,6 +35,9 @@ const getSessionId = () => {
   return sessionId;
 };
 
+// Lets the API rate limit per session rather than per client address
+axios.defaults.headers.common['X-Session-Id'] = getSessionId();
+
 const LandingPage = ({ onStartQuiz, onViewProgress }) => {
   const [stats, setStats] = useState({ total_quizzes: 0, average_score: 0 });
 
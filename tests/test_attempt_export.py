@@ -0,0 +1,14 @@
+import httpx
+
+import server
+
+
+async def test_export_endpoint_needs_admin_token(monkeypatch):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+        assert (await client.get("/api/attempts/export")).status_code == 403
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+        assert (await client.get("/api/attempts/export", headers={"X-Admin-Token": "wrong"})).status_code == 403
+        # Past the token check; the in-memory backend has nothing to export from
+        response = await client.get("/api/attempts/export", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 501
@@ -0,0 +1,47 @@
+import asyncio
+
+import server
+from storage import MemoryStorage
+
+
+class FlakyStorage(MemoryStorage):
+    """Fails the first insert with an error that is not a PyMongoError"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    async def insert_attempts(self, attempts):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("disk I/O error")
+        await super().insert_attempts(attempts)
+
+
+def attempt(i):
+    return {"id": str(i), "session_id": "s1", "questions": [], "user_answers": [], "score": 0.0,
+            "completed_at": server.datetime.now(server.timezone.utc)}
+
+
+async def test_writer_survives_a_failed_batch(monkeypatch):
+    store = FlakyStorage()
+    monkeypatch.setattr(server, "storage", store)
+    writer = server.AttemptWriter(enabled=True, batch_size=1, max_delay=0.01, max_queue=5)
+    writer.start()
+    await writer.write(attempt(0))
+    # Well past the queue size: a dead flush task would leave these blocked forever
+    await asyncio.wait_for(asyncio.gather(*[writer.write(attempt(i)) for i in range(1, 20)]), timeout=5)
+    await asyncio.wait_for(writer.drain(), timeout=5)
+    assert sorted(int(a["id"]) for a in store._attempts) == list(range(1, 20))
+
+
+async def test_writes_go_direct_once_the_task_is_gone(monkeypatch):
+    store = MemoryStorage()
+    monkeypatch.setattr(server, "storage", store)
+    writer = server.AttemptWriter(enabled=True, batch_size=10, max_delay=0.01, max_queue=2)
+    writer.start()
+    writer._task.cancel()
+    await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*[writer.write(attempt(i)) for i in range(5)]), timeout=5)
+    await asyncio.wait_for(writer.drain(), timeout=5)
+    assert len(store._attempts) == 5
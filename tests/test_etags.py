@@ -0,0 +1,38 @@
+import httpx
+import pytest
+from starlette.requests import Request
+
+import server
+from storage import MemoryStorage
+
+
+def request(if_none_match):
+    return Request({"type": "http", "headers": [(b"if-none-match", if_none_match.encode())]})
+
+
+@pytest.mark.parametrize("header", ['"q-1"', 'W/"q-1"', '"other", W/"q-1"', " * "])
+def test_matching_tags_are_not_modified(header):
+    response = server.not_modified(request(header), '"q-1"', "no-cache")
+    assert response is not None and response.status_code == 304
+
+
+@pytest.mark.parametrize("header", ['"q-2"', 'W/"q-2"', '"q-1-stale"'])
+def test_other_tags_are_modified(header):
+    assert server.not_modified(request(header), '"q-1"', "no-cache") is None
+
+
+async def test_encoded_responses_carry_a_weak_etag(monkeypatch):
+    monkeypatch.setattr(server, "storage", MemoryStorage())
+    server.question_bank.invalidate()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        assert (await client.post("/api/questions/seed")).status_code == 200
+        identity = await client.get("/api/questions", headers={"Accept-Encoding": "identity"})
+        assert identity.headers["etag"].startswith('"')
+        for encoding in ("gzip", "br"):
+            encoded = await client.get("/api/questions", headers={"Accept-Encoding": encoding})
+            assert encoded.headers["content-encoding"] == encoding
+            assert encoded.headers["etag"] == "W/" + identity.headers["etag"]
+            revalidated = await client.get("/api/questions", headers={
+                "Accept-Encoding": encoding, "If-None-Match": encoded.headers["etag"]
+            })
+            assert revalidated.status_code == 304
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
+
+import server
+
+
+@pytest.fixture
+def scratch_db(monkeypatch, mongo_url):
+    """Point the server module at a fresh database; tests create and drop it on their own loop"""
+    name = f"netst_indexes_{uuid.uuid4().hex[:8]}"
+
+    def connect():
+        client = AsyncIOMotorClient(mongo_url)
+        monkeypatch.setattr(server, "db", client[name])
+        return client
+    return connect
+
+
+async def test_hot_queries_use_an_index(scratch_db):
+    client = scratch_db()
+    try:
+        await server.ensure_indexes()
+        await server.db.questions.insert_many([
+            {"id": str(i), "difficulty_level": "beginner", "topic": "subnetting", "created_at": i} for i in range(50)
+        ])
+        assert await server.find_collscans() == []
+    finally:
+        await client.drop_database(server.db.name)
+        client.close()
+
+
+async def test_changed_session_ttl_is_applied(scratch_db, monkeypatch):
+    client = scratch_db()
+    try:
+        await server.ensure_indexes()
+        changed = [
+            index if index.document["name"] != "created_at_ttl"
+            else IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=3600)
+            for index in server.INDEXES["quiz_sessions"]
+        ]
+        monkeypatch.setitem(server.INDEXES, "quiz_sessions", changed)
+        await server.ensure_indexes()
+        indexes = await server.db.quiz_sessions.index_information()
+        assert indexes["created_at_ttl"]["expireAfterSeconds"] == 3600
+    finally:
+        await client.drop_database(server.db.name)
+        client.close()
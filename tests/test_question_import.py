@@ -0,0 +1,77 @@
+import httpx
+import pytest
+
+import server
+from storage import MemoryStorage
+
+CSV_HEADER = "question_text,options,correct_answer,explanation,topic,difficulty_level\n"
+
+
+def csv_row(i, text=None):
+    return f"{text or f'Question {i}'},A|B|C|D,1,Because,subnetting,beginner\n"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryStorage()
+    monkeypatch.setattr(server, "storage", store)
+    return store
+
+
+async def import_body(body: bytes, format: str):
+    rows = server.parse_question_rows(server.iter_lines(server.aiter_items([body])), format)
+    return await server.import_questions(rows)
+
+
+async def test_unbalanced_csv_quote_is_rejected(store):
+    body = CSV_HEADER + csv_row(0) + csv_row(1, text='"Stray quote') + csv_row(2)
+    report = await import_body(body.encode(), "csv")
+    assert (report.received, report.inserted, report.rejected) == (2, 1, 1)
+    assert "Unterminated" in report.errors[0]["error"]
+
+
+async def test_undecodable_line_is_rejected(store):
+    body = (
+        b'{"question_text": "Q1", "options": ["A", "B"], "correct_answer": 0, "explanation": "E",'
+        b' "topic": "subnetting", "difficulty_level": "beginner"}\n'
+        b'\xff\xfe not utf-8\n'
+    )
+    report = await import_body(body, "ndjson")
+    assert (report.received, report.inserted, report.rejected) == (2, 1, 1)
+
+
+async def test_failed_chunk_still_bumps_questions(store, monkeypatch):
+    calls = 0
+    upsert = store.upsert_questions
+
+    async def fail_second_chunk(questions):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("storage went away")
+        return await upsert(questions)
+
+    monkeypatch.setattr(store, "upsert_questions", fail_second_chunk)
+    before = server.versions.get("questions")
+    rows = server.aiter_items([
+        {"question_text": f"Q{i}", "options": ["A", "B"], "correct_answer": 0, "explanation": "E",
+         "topic": "subnetting", "difficulty_level": "beginner"} for i in range(4)
+    ])
+    with pytest.raises(RuntimeError):
+        await server.import_questions(rows, chunk_size=2)
+    assert server.versions.get("questions") == before + 1
+    assert await store.count_questions() == 2
+
+
+async def test_import_endpoint_needs_admin_token(store, monkeypatch):
+    body = (CSV_HEADER + csv_row(0)).encode()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+        assert (await client.post("/api/questions/import?format=csv", content=body)).status_code == 403
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+        response = await client.post("/api/questions/import?format=csv", content=body,
+                                     headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 403
+        response = await client.post("/api/questions/import?format=csv", content=body,
+                                     headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200 and response.json()["inserted"] == 1
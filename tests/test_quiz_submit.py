@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from storage import MemoryStorage
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(server, "storage", MemoryStorage())
+    server.question_bank.invalidate()
+    return server.app
+
+
+async def start_quiz(client):
+    assert (await client.post("/api/questions/seed")).status_code == 200
+    response = await client.post("/api/quiz/start", json={"difficulty_level": "beginner", "question_count": 3})
+    assert response.status_code == 200
+    return response.json()
+
+
+def submission(quiz, session_id="s1"):
+    return {"session_id": session_id, "quiz_id": quiz["id"], "answers": [0, 1, 2], "time_taken": 30}
+
+
+async def test_quiz_is_graded_once(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        quiz = await start_quiz(client)
+        assert (await client.post("/api/quiz/submit", json=submission(quiz))).status_code == 200
+        replay = await client.post("/api/quiz/submit", json=submission(quiz))
+        assert replay.status_code == 409
+        progress = (await client.get("/api/progress/s1")).json()
+        assert progress["total_quizzes"] == 1
+
+
+async def test_concurrent_replays_are_graded_once(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        quiz = await start_quiz(client)
+        # Drop the cached copy so every request claims the session through storage
+        server.quiz_sessions._entries.clear()
+        responses = await asyncio.gather(*[
+            client.post("/api/quiz/submit", json=submission(quiz)) for _ in range(4)
+        ])
+        assert sorted(r.status_code for r in responses) == [200, 409, 409, 409]
+        assert (await server.storage.get_progress("s1"))["total_quizzes"] == 1
+
+
+async def test_invalid_submission_does_not_use_up_the_quiz(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        quiz = await start_quiz(client)
+        too_many = {**submission(quiz), "answers": [0, 0, 0, 0]}
+        assert (await client.post("/api/quiz/submit", json=too_many)).status_code == 400
+        assert (await client.post("/api/quiz/submit", json=submission(quiz))).status_code == 200
+
+
+async def test_corrected_answer_key_applies_to_quizzes_in_flight(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        quiz = await start_quiz(client)
+        for question, answer in zip(quiz["questions"], [0, 1, 2]):
+            server.storage._questions[question["id"]]["correct_answer"] = answer
+        await server.versions.bump("questions")
+        response = await client.post("/api/quiz/submit", json=submission(quiz))
+        assert response.status_code == 200
+        assert response.json()["score"] == 100
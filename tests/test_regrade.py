@@ -0,0 +1,94 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from storage import MotorStorage
+
+TOPICS = ["subnetting", "subnetting", "osi_model", "osi_model"]
+
+
+@pytest.fixture
+def scratch_db(monkeypatch, mongo_url):
+    """Point the server module and its storage at a fresh database created on the test's loop"""
+    name = f"netst_regrade_{uuid.uuid4().hex[:8]}"
+
+    def connect():
+        client = AsyncIOMotorClient(mongo_url)
+        monkeypatch.setattr(server, "db", client[name])
+        monkeypatch.setattr(server, "storage", MotorStorage(client[name]))
+        return client
+    return connect
+
+
+async def submit(answers, completed_at, session_id="s1", answer_key=(0, 0, 0, 0)):
+    correct = [answer == key for answer, key in zip(answers, answer_key)]
+    attempt = {
+        "id": str(uuid.uuid4()), "session_id": session_id, "questions": [f"q{i}" for i in range(4)],
+        "user_answers": answers, "score": sum(correct) / 4 * 100, "total_questions": 4,
+        "correct_answers": sum(correct), "difficulty_level": "beginner", "topic_filter": None,
+        "time_taken": 30, "completed_at": completed_at, "answer_key": list(answer_key),
+    }
+    await server.db.quiz_attempts.insert_one(dict(attempt))
+    await server.storage.record_progress(attempt, TOPICS, correct)
+    return attempt
+
+
+async def test_regrade_applies_deltas_to_progress(scratch_db):
+    client = scratch_db()
+    try:
+        await server.db.questions.insert_many([
+            {"id": f"q{i}", "topic": topic, "correct_answer": 0, "difficulty_level": "beginner"}
+            for i, topic in enumerate(TOPICS)
+        ])
+        now = datetime(2024, 5, 1)
+        await submit([1, 0, 0, 0], now)
+        await submit([0, 0, 0, 1], now - timedelta(minutes=5))
+
+        await server.db.questions.update_one({"id": "q0"}, {"$set": {"correct_answer": 1}})
+        report = await server.regrade_attempts(["q0"])
+        assert (report.regraded, report.sessions_updated, report.topic_stats_unresolved) == (2, 1, 0)
+        progress = await server.db.user_progress.find_one({"session_id": "s1"})
+        assert progress["total_score"] == 150 and progress["best_score"] == 100
+        assert progress["topic_stats"]["subnetting"] == {"answered": 4, "correct": 3}
+        assert [s["score"] for s in progress["recent_scores"]] == [100, 50]
+
+        # A lower score can take best_score down with it
+        await server.db.questions.update_one({"id": "q0"}, {"$set": {"correct_answer": 3}})
+        await server.regrade_attempts(["q0"])
+        progress = await server.db.user_progress.find_one({"session_id": "s1"})
+        assert progress["total_score"] == 125 and progress["best_score"] == 75
+        assert progress["topic_stats"]["subnetting"] == {"answered": 4, "correct": 2}
+    finally:
+        await client.drop_database(server.db.name)
+        client.close()
+
+
+async def test_regrade_moves_correct_answers_between_topics(scratch_db):
+    client = scratch_db()
+    try:
+        await server.db.questions.insert_many([
+            {"id": f"q{i}", "topic": topic, "correct_answer": 0, "difficulty_level": "beginner"}
+            for i, topic in enumerate(TOPICS)
+        ])
+        await submit([0, 1, 1, 1], datetime(2024, 5, 1))
+        # Stored before attempts recorded their answer key; its old split across topics is unknown
+        legacy = await submit([0, 1, 1, 1], datetime(2024, 5, 1), session_id="s2")
+        await server.db.quiz_attempts.update_one({"id": legacy["id"]}, {"$unset": {"answer_key": ""}})
+
+        # q0 (subnetting) is now wrong and q2 (osi_model) right: same total, different topics
+        await server.db.questions.update_one({"id": "q0"}, {"$set": {"correct_answer": 2}})
+        await server.db.questions.update_one({"id": "q2"}, {"$set": {"correct_answer": 1}})
+        report = await server.regrade_attempts(["q0", "q2"])
+        assert (report.regraded, report.sessions_updated, report.topic_stats_unresolved) == (1, 1, 1)
+        progress = await server.db.user_progress.find_one({"session_id": "s1"})
+        assert progress["total_score"] == 25
+        assert progress["topic_stats"] == {"subnetting": {"answered": 2, "correct": 0},
+                                           "osi_model": {"answered": 2, "correct": 1}}
+        attempt = await server.db.quiz_attempts.find_one({"session_id": "s1"})
+        assert attempt["answer_key"] == [2, 0, 1, 0]
+    finally:
+        await client.drop_database(server.db.name)
+        client.close()
@@ -0,0 +1,36 @@
+import server
+from search import QuestionSearchIndex
+from storage import MemoryStorage
+
+
+def question(i, explanation="Because"):
+    return {"id": f"q{i}", "question_text": f"Network question {i}", "options": ["A", "B", "C", "D"],
+            "explanation": explanation, "topic": "osi_model", "difficulty_level": "beginner"}
+
+
+def test_reindexed_questions_still_match():
+    index = QuestionSearchIndex()
+    index.add(question(i) for i in range(20))
+    # Dead slots still sit in the postings of every term these questions share
+    index.add(question(i, explanation="Corrected") for i in range(4))
+    assert index.dead == 4
+    total, hits = index.search("network question", limit=30)
+    assert total == 20
+    assert sorted(question_id for question_id, _ in hits) == sorted(f"q{i}" for i in range(20))
+    assert all(score > 0 for _, score in hits)
+
+
+async def test_stale_index_is_served_while_it_rebuilds(monkeypatch):
+    store = MemoryStorage()
+    monkeypatch.setattr(server, "storage", store)
+    search = server.QuestionSearch()
+    await store.upsert_questions([{**question(0), "content_hash": "h0"}])
+    assert (await search.search("network"))[0] == 1
+
+    await store.upsert_questions([{**question(1), "content_hash": "h1"}])
+    search.invalidate()
+    # Answered from the old index; the rebuild has been started but not waited for
+    assert (await search.search("network"))[0] == 1
+    assert search.stale and not search._rebuild.done()
+    await search._rebuild
+    assert not search.stale and (await search.search("network"))[0] == 2
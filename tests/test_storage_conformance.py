@@ -0,0 +1,190 @@
+import contextlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from storage import (PROGRESS_SUMMARY_FIELDS, RECENT_QUESTIONS_LIMIT, RECENT_SCORES_LIMIT, MemoryStorage,
+                     MotorStorage, SQLiteStorage, Storage, to_stored)
+
+
+@pytest.fixture(params=["memory", "sqlite", "mongo"])
+def backend(request, tmp_path):
+    """Open a fresh, empty storage of each backend; mongo is skipped without a mongod"""
+    mongo_url = request.getfixturevalue("mongo_url") if request.param == "mongo" else None
+
+    @contextlib.asynccontextmanager
+    async def open_backend():
+        client = None
+        if request.param == "mongo":
+            client = AsyncIOMotorClient(mongo_url)
+            storage = MotorStorage(client[f"netst_conformance_{uuid.uuid4().hex[:8]}"])
+        elif request.param == "sqlite":
+            storage = SQLiteStorage(str(tmp_path / "conformance.sqlite3"))
+        else:
+            storage = MemoryStorage()
+        await storage.start()
+        try:
+            yield storage
+        finally:
+            await storage.close()
+            if client is not None:
+                await client.drop_database(storage.db.name)
+                client.close()
+    return open_backend
+
+
+def _question(i: int, difficulty_level: str = "beginner", topic: str = "osi_model", **overrides) -> Dict[str, Any]:
+    question = {
+        "question_text": f"Conformance question {i}",
+        "options": ["A", "B", "C", "D"],
+        "correct_answer": i % 4,
+        "explanation": "Because",
+        "topic": topic,
+        "difficulty_level": difficulty_level,
+        "content_hash": f"hash-{i}",
+    }
+    question.update(overrides)
+    return question
+
+
+async def _seed(storage: Storage, count: int = 12) -> List[Dict[str, Any]]:
+    levels, topics = ["beginner", "advanced"], ["osi_model", "subnetting", "switching"]
+    await storage.upsert_questions([
+        _question(i, levels[i % 2], topics[i % 3]) for i in range(count)
+    ])
+    return [q async for q in storage.iter_questions()]
+
+
+def _attempt(session_id: str, score: float, minutes_ago: int, question_ids: List[str]) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "questions": question_ids,
+        "user_answers": [0] * len(question_ids),
+        "score": score,
+        "total_questions": len(question_ids),
+        "correct_answers": 0,
+        "difficulty_level": "beginner",
+        "topic_filter": None,
+        "time_taken": 30,
+        "completed_at": datetime.now(timezone.utc) - timedelta(minutes=minutes_ago),
+    }
+
+
+async def test_question_upserts(backend):
+    async with backend() as storage:
+        assert await storage.upsert_questions([_question(i) for i in range(3)]) == (3, 0, 0)
+        before = {q["content_hash"]: q async for q in storage.iter_questions(fields=["id", "created_at", "content_hash"])}
+        assert await storage.upsert_questions([_question(i) for i in range(3)]) == (0, 0, 3)
+        changed = [_question(0, explanation="Corrected"), _question(1), _question(3)]
+        assert await storage.upsert_questions(changed) == (1, 1, 1)
+        after = {q["content_hash"]: q async for q in storage.iter_questions(fields=["id", "created_at", "content_hash"])}
+        for content_hash, doc in before.items():
+            assert after[content_hash] == doc, "upserts must keep id and created_at"
+        [first] = await storage.get_questions([after["hash-0"]["id"]])
+        assert first["explanation"] == "Corrected"
+        by_hash = {q["content_hash"]: q["id"] for q in await storage.get_questions_by_hash(["hash-0", "hash-3", "missing"])}
+        assert by_hash == {"hash-0": after["hash-0"]["id"], "hash-3": after["hash-3"]["id"]}
+        assert isinstance(first["created_at"], datetime) and first["created_at"].tzinfo is None
+        assert await storage.count_questions() == 4
+
+
+async def test_question_listing(backend):
+    async with backend() as storage:
+        questions = await _seed(storage)
+        keys = [(q["created_at"], q["id"]) for q in questions]
+        assert keys == sorted(keys) and len(keys) == 12
+        assert all("content_hash" not in q and "_id" not in q for q in questions)
+        page = [q async for q in storage.iter_questions(after=keys[4], limit=3)]
+        assert [(q["created_at"], q["id"]) for q in page] == keys[5:8]
+        streamed = [q async for q in storage.iter_questions(batch_size=5)]
+        assert streamed == questions
+        advanced = [q async for q in storage.iter_questions(difficulty_level="advanced", topic="subnetting")]
+        assert advanced and all(q["difficulty_level"] == "advanced" and q["topic"] == "subnetting" for q in advanced)
+        assert len(advanced) == await storage.count_questions("advanced", "subnetting")
+        projected = [q async for q in storage.iter_questions(fields=["topic", "created_at", "id"], limit=2)]
+        assert all(set(q) == {"topic", "created_at", "id"} for q in projected)
+
+
+async def test_sampling(backend):
+    async with backend() as storage:
+        questions = await _seed(storage)
+        assert await storage.count_questions("beginner") == 6
+        sample = await storage.sample_questions("beginner", None, 4)
+        assert len(sample) == 4 and len({q["id"] for q in sample}) == 4
+        assert all(q["difficulty_level"] == "beginner" for q in sample)
+        sample = await storage.sample_questions("beginner", "osi_model", 2)
+        assert len(sample) == 2 and all(q["topic"] == "osi_model" for q in sample)
+        by_id = {q["id"]: q for q in await storage.get_questions([q["id"] for q in questions[:5]])}
+        assert set(by_id) == {q["id"] for q in questions[:5]}
+
+
+async def test_quiz_sessions(backend):
+    async with backend() as storage:
+        now = datetime.now(timezone.utc)
+        session = {"id": "quiz-1", "question_ids": ["a", "b"], "answer_key": [1, 2], "difficulty_level": "beginner",
+                   "topic_filter": None, "created_at": now}
+        await storage.save_quiz_session(session)
+        await storage.save_quiz_session({**session, "id": "quiz-old", "created_at": now - timedelta(days=30)})
+        stored = await storage.get_quiz_session("quiz-1")
+        assert stored == to_stored(session), stored
+        assert await storage.get_quiz_session("quiz-old") is None, "expired sessions must not be returned"
+        assert await storage.get_quiz_session("missing") is None
+        assert await storage.mark_quiz_submitted("quiz-1")
+        assert not await storage.mark_quiz_submitted("quiz-1"), "a session is submitted only once"
+        assert not await storage.mark_quiz_submitted("quiz-old") and not await storage.mark_quiz_submitted("missing")
+        assert (await storage.get_quiz_session("quiz-1"))["submitted_at"] is not None
+
+
+async def test_progress(backend):
+    async with backend() as storage:
+        ids = [f"q{i}" for i in range(240)]
+        await storage.insert_attempts([_attempt("s1", 40.0, 10, ids[:2])])
+        first = await storage.record_progress(_attempt("s1", 40.0, 10, ids[:2]), ["osi_model", "switching"], [True, False])
+        assert first["total_quizzes"] == 1 and first["best_score"] == 40.0 and set(first) == set(PROGRESS_SUMMARY_FIELDS)
+        for minutes_ago in range(12):
+            attempt = _attempt("s1", 50.0 + minutes_ago, minutes_ago, ids[minutes_ago * 20:minutes_ago * 20 + 20])
+            summary = await storage.record_progress(attempt, ["osi_model"] * 20, [True] * 10 + [False] * 10)
+        assert summary["total_quizzes"] == 13 and summary["best_score"] == 61.0
+        progress = await storage.get_progress("s1")
+        assert progress["total_score"] == 40.0 + sum(50.0 + m for m in range(12))
+        assert progress["topics_attempted"] == {"general": 13} and progress["difficulty_progress"] == {"beginner": 13}
+        assert progress["topic_stats"] == {"osi_model": {"answered": 241, "correct": 121},
+                                           "switching": {"answered": 1, "correct": 0}}
+        dates = [s["date"] for s in progress["recent_scores"]]
+        assert len(dates) == RECENT_SCORES_LIMIT and dates == sorted(dates, reverse=True)
+        # The newest ids pushed are kept, whatever the attempts' dates
+        assert progress["recent_question_ids"] == ids[-RECENT_QUESTIONS_LIMIT:]
+        assert progress["last_activity"] == dates[0] == summary["last_activity"]
+        assert "recent_question_ids" not in await storage.get_progress("s1", exclude=("recent_question_ids",))
+        assert await storage.get_progress("nobody") is None
+
+
+async def test_leaderboard(backend):
+    async with backend() as storage:
+        for session_id, scores in (("a", [90, 80, 70]), ("b", [100, 100]), ("c", [60, 90, 90]), ("d", [50, 80, 90])):
+            for score in scores:
+                await storage.record_progress(_attempt(session_id, float(score), 1, []), [], [])
+        entries = await storage.top_sessions(min_quizzes=3, limit=10)
+        assert [e["_id"] for e in entries] == ["a", "c", "d"], entries
+        assert entries[0]["average_score"] == 80.0 and entries[0]["total_quizzes"] == 3 and entries[0]["best_score"] == 90
+        assert [e["_id"] for e in await storage.top_sessions(min_quizzes=2, limit=2)] == ["b", "a"]
+
+
+async def test_question_stats(backend):
+    async with backend() as storage:
+        questions = [{"id": f"q{i}", "topic": "osi_model" if i < 2 else "switching", "difficulty_level": "beginner"}
+                     for i in range(3)]
+        await storage.record_answers(questions, [0, 1, None], [True, False, False])
+        await storage.record_answers(questions[:2], [0, 2], [True, True])
+        stats = await storage.question_stats()
+        assert [s["question_id"] for s in stats] == ["q2", "q1", "q0"], stats
+        assert stats[0] == {"question_id": "q2", "served": 1, "correct": 0, "skipped": 1, "choices": {},
+                            "topic": "switching", "difficulty_level": "beginner", "accuracy": 0.0}, stats[0]
+        assert stats[1]["choices"] == {"1": 1, "2": 1} and stats[1]["accuracy"] == 0.5
+        assert [s["question_id"] for s in await storage.question_stats(topic="osi_model", sort_by="served",
+                                                                       descending=True, limit=1)] == ["q0"]
+        assert [s["question_id"] for s in await storage.question_stats(min_served=2)] == ["q1", "q0"]
@@ -0,0 +1,23 @@
+import server
+
+
+async def test_shared_bumps_are_coalesced(monkeypatch):
+    versions = server.VersionCounters(mode="poll")
+    written = []
+
+    async def bump(name):
+        written.append(name)
+
+    monkeypatch.setattr(versions, "bump", bump)
+    for _ in range(100):
+        versions.bump_later("attempts")
+    await versions._flush_deferred()
+    await versions._flush_deferred()
+    assert written == ["attempts"]
+
+
+async def test_local_bumps_are_immediate():
+    versions = server.VersionCounters(mode="off")
+    tag = versions.etag("attempts")
+    versions.bump_later("attempts")
+    assert versions.etag("attempts") != tag